@@ -3,42 +3,70 @@ Configuration settings for the Telegram Video Downloader Bot
 """
 
 import os
+from dataclasses import dataclass
+from types import MappingProxyType
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables once at import
 load_dotenv()
 
-class Config:
+
+@dataclass(frozen=True, slots=True)
+class _Config:
+    """Immutable configuration snapshot built once from the environment"""
     # Bot settings
-    TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-    
-    if not TELEGRAM_BOT_TOKEN:
-        raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
-    
+    TELEGRAM_BOT_TOKEN: str
     # Download settings - Telegram bot limit is 50MB
-    MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 50))  # 50MB for Telegram bots
-    DOWNLOAD_TIMEOUT = int(os.getenv('DOWNLOAD_TIMEOUT', 600))    # Increased timeout for larger files
-    TEMP_DIR = os.getenv('TEMP_DIR', './downloads')
-    
+    MAX_FILE_SIZE_MB: int
+    DOWNLOAD_TIMEOUT: int
+    TEMP_DIR: str
     # Rate limiting
-    MAX_DOWNLOADS_PER_HOUR = int(os.getenv('MAX_DOWNLOADS_PER_HOUR', 5))
-    
+    MAX_DOWNLOADS_PER_HOUR: int
+    # Concurrency cap for simultaneous yt-dlp jobs (memory/disk/network)
+    MAX_CONCURRENT_DOWNLOADS: int
+    # Telegram API concurrency
+    CONCURRENT_UPDATES: int
+    CONNECTION_POOL_SIZE: int
+    # Update types the bot handles; Telegram filters everything else
+    # server-side (no edited_message/channel_post/my_chat_member on the wire)
+    ALLOWED_UPDATES: tuple
     # Logging
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    
-    # Ensure temp directory exists
-    os.makedirs(TEMP_DIR, exist_ok=True)
-    
+    LOG_LEVEL: str
     # yt-dlp base options
-    YT_DLP_OPTIONS = {
-        'outtmpl': f'{TEMP_DIR}/%(title)s.%(ext)s',
+    YT_DLP_OPTIONS: dict
+
+
+_env = os.environ
+
+if not _env.get('TELEGRAM_BOT_TOKEN'):
+    raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
+
+_temp_dir = _env.get('TEMP_DIR', './downloads')
+
+Config = _Config(
+    TELEGRAM_BOT_TOKEN=_env['TELEGRAM_BOT_TOKEN'],
+    MAX_FILE_SIZE_MB=int(_env.get('MAX_FILE_SIZE_MB', '50')),  # 50MB for Telegram bots
+    DOWNLOAD_TIMEOUT=int(_env.get('DOWNLOAD_TIMEOUT', '600')),  # Increased timeout for larger files
+    TEMP_DIR=_temp_dir,
+    MAX_DOWNLOADS_PER_HOUR=int(_env.get('MAX_DOWNLOADS_PER_HOUR', '5')),
+    MAX_CONCURRENT_DOWNLOADS=int(_env.get('MAX_CONCURRENT_DOWNLOADS', '4')),
+    CONCURRENT_UPDATES=int(_env.get('CONCURRENT_UPDATES', '256')),
+    CONNECTION_POOL_SIZE=int(_env.get('CONNECTION_POOL_SIZE', '128')),
+    ALLOWED_UPDATES=('message', 'callback_query'),
+    LOG_LEVEL=_env.get('LOG_LEVEL', 'INFO'),
+    YT_DLP_OPTIONS={
+        'outtmpl': f'{_temp_dir}/%(title)s.%(ext)s',
         'format': 'best',
         'noplaylist': True,
         'extractaudio': False,
         'embed_subs': False,
         'writesubtitles': False,
         'writeautomaticsub': False,
-    }
+    },
+)
+
+# Ensure temp directory exists
+os.makedirs(Config.TEMP_DIR, exist_ok=True)
 
 # Enhanced download options with video and audio support
 DOWNLOAD_OPTIONS = {
@@ -122,4 +150,23 @@ PLATFORM_ERROR_MESSAGES = {
     'instagram': "❌ Instagram content unavailable. Private accounts are not supported.",
     'twitter': "❌ Twitter video unavailable. It might be private or deleted.",
     'generic': "❌ Video unavailable. The content might be private, deleted, or unsupported."
-}
\ No newline at end of file
+}
+
+# Freeze the read-only configuration tables against accidental mutation
+DOWNLOAD_OPTIONS = MappingProxyType({
+    content_type: MappingProxyType({
+        quality: MappingProxyType(options)
+        for quality, options in qualities.items()
+    })
+    for content_type, qualities in DOWNLOAD_OPTIONS.items()
+})
+ERROR_MESSAGES = MappingProxyType(ERROR_MESSAGES)
+PLATFORM_ERROR_MESSAGES = MappingProxyType(PLATFORM_ERROR_MESSAGES)
+
+# Flat lookup table for the download path: one dict probe instead of two.
+# Keyboard generation keeps iterating the nested DOWNLOAD_OPTIONS by content type.
+DOWNLOAD_OPTIONS_FLAT = MappingProxyType({
+    (content_type, quality): options
+    for content_type, qualities in DOWNLOAD_OPTIONS.items()
+    for quality, options in qualities.items()
+})
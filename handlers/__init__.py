@@ -0,0 +1,8 @@
+"""
+Handler registration for the Telegram Video Downloader Bot
+"""
+
+from handlers.callbacks import setup_callback_handlers
+from handlers.commands import setup_command_handlers
+
+__all__ = ['setup_callback_handlers', 'setup_command_handlers']
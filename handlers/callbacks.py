@@ -3,18 +3,35 @@ Callback handlers for inline keyboards
 """
 
 import logging
+import re
 from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from services.downloader import downloader, ProgressTracker, FileUploader
+from services.validator import validator
 from utils.keyboards import (
     create_quality_keyboard, create_content_type_keyboard, create_main_menu_keyboard,
     create_completion_keyboard, create_help_keyboard, create_retry_keyboard, create_error_keyboard,
-    create_cancel_keyboard
+    create_cancel_keyboard, create_stats_keyboard
 )
-from utils.messages import MessageTemplates
+from utils.rate_limiter import rate_limiter
+from utils.messages import MessageTemplates, format_filesize
+from utils.helpers import safe_delete_message
 
 logger = logging.getLogger(__name__)
 
+# Precompiled callback_data patterns (shape validation + field extraction in one step).
+# Tokens are compact: single-char action prefix, single-char content type,
+# base36 session token.
+_TYPE_RE = re.compile(r'^t([va])([0-9a-z]+)$')
+_QUALITY_RE = re.compile(r'^q([va])([0-9a-z]+)_([0-9a-z]+)$')
+_BACK_RE = re.compile(r'^b([0-9a-z]+)$')
+_RETRY_RE = re.compile(r'^r([0-9a-z]+)$')
+_CANCEL_RE = re.compile(r'^cancel$')
+_MENU_RE = re.compile(r'^menu_(download|help|stats|main)$')
+
+# Expand the single-char content type used on the wire
+_CT_FROM_CHAR = {'v': 'video', 'a': 'audio'}
+
 async def content_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle content type selection (video/audio)"""
     query = update.callback_query
@@ -23,53 +40,50 @@ async def content_type_callback(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Content type callback from user {user_id}: {query.data}")
+    logger.info("Content type callback from user %s: %s", user_id, query.data)
     
     try:
-        # Parse callback data
-        callback_data = query.data
-        parts = callback_data.split('_')
+        # Parse callback data with the precompiled pattern
+        match = _TYPE_RE.match(query.data)
         
-        if len(parts) != 3 or parts[0] != 'type':
+        if match is None:
             error_text = "❌ Invalid selection."
             keyboard = create_error_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        content_type = parts[1]  # 'video' or 'audio'
-        url_hash = parts[2]
+        content_type, token = _CT_FROM_CHAR[match.group(1)], match.group(2)
         
-        # Get stored video info
-        video_info = context.user_data.get('video_info')
-        current_url = context.user_data.get('current_url')
+        # Get stored session with a single lookup
+        session = context.user_data.get('session')
         
-        if not video_info or not current_url:
+        if session is None:
             error_text = "❌ Session expired. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        # Verify URL hash matches
-        if str(hash(current_url) % 10000) != url_hash:
+        # Verify session token matches
+        if session.token != token:
             error_text = "❌ Invalid session. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
         # Store selected content type
-        context.user_data['content_type'] = content_type
+        session.content_type = content_type
         
         # Create quality selection keyboard
-        keyboard = create_quality_keyboard(content_type, current_url)
+        keyboard = create_quality_keyboard(content_type, session.token)
         
         # Update message with quality selection
-        quality_selection_text = MessageTemplates.quality_selection(content_type, video_info)
+        quality_selection_text = MessageTemplates.quality_selection(content_type, session.info)
         await safe_edit_message(query, quality_selection_text, keyboard)
         
-        logger.info(f"Content type selected by user {user_id}: {content_type}")
+        logger.info("Content type selected by user %s: %s", user_id, content_type)
         
     except Exception as e:
-        logger.error(f"Content type callback error for user {user_id}: {e}")
+        logger.error("Content type callback error for user %s: %s", user_id, e)
         error_text = "❌ An error occurred. Please try again with /download"
         keyboard = create_main_menu_keyboard()
         await safe_edit_message(query, error_text, keyboard)
@@ -82,47 +96,41 @@ async def quality_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Quality callback from user {user_id}: {query.data}")
+    logger.info("Quality callback from user %s: %s", user_id, query.data)
     
     try:
-        # Parse callback data
-        callback_data = query.data
-        parts = callback_data.split('_')
+        # Parse callback data with the precompiled pattern
+        match = _QUALITY_RE.match(query.data)
         
-        if len(parts) != 4 or parts[0] != 'quality':
+        if match is None:
             error_text = "❌ Invalid selection."
             keyboard = create_error_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        content_type = parts[1]  # 'video' or 'audio'
-        quality = parts[2]       # quality/format key
-        url_hash = parts[3]
+        content_type, quality, token = _CT_FROM_CHAR[match.group(1)], match.group(2), match.group(3)
         
-        # Get stored data
-        video_info = context.user_data.get('video_info')
-        current_url = context.user_data.get('current_url')
-        stored_content_type = context.user_data.get('content_type')
+        # Get stored session with a single lookup
+        session = context.user_data.get('session')
         
-        if not all([video_info, current_url, stored_content_type]):
+        if session is None or not session.content_type:
             error_text = "❌ Session expired. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
         # Verify data consistency
-        if (str(hash(current_url) % 10000) != url_hash or
-            content_type != stored_content_type):
+        if session.token != token or content_type != session.content_type:
             error_text = "❌ Invalid session. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
         # Start download process
-        await start_download(query, current_url, content_type, quality, video_info, context)
+        await start_download(query, session, content_type, quality, context)
         
     except Exception as e:
-        logger.error(f"Quality callback error for user {user_id}: {e}")
+        logger.error("Quality callback error for user %s: %s", user_id, e)
         error_text = "❌ An error occurred during download. Please try again."
         keyboard = create_main_menu_keyboard()
         await safe_edit_message(query, error_text, keyboard)
@@ -135,51 +143,49 @@ async def back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Back callback from user {user_id}: {query.data}")
+    logger.info("Back callback from user %s: %s", user_id, query.data)
     
     try:
-        # Parse callback data
-        callback_data = query.data
-        parts = callback_data.split('_')
+        # Parse callback data with the precompiled pattern
+        match = _BACK_RE.match(query.data)
         
-        if len(parts) != 3 or parts[0] != 'back' or parts[1] != 'type':
+        if match is None:
             error_text = "❌ Invalid selection."
             keyboard = create_error_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        url_hash = parts[2]
+        token = match.group(1)
         
-        # Get stored data
-        video_info = context.user_data.get('video_info')
-        current_url = context.user_data.get('current_url')
+        # Get stored session with a single lookup
+        session = context.user_data.get('session')
         
-        if not video_info or not current_url:
+        if session is None:
             error_text = "❌ Session expired. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        # Verify URL hash
-        if str(hash(current_url) % 10000) != url_hash:
+        # Verify session token
+        if session.token != token:
             error_text = "❌ Invalid session. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
         # Clear content type selection
-        context.user_data.pop('content_type', None)
+        session.content_type = None
         
         # Show content type selection again
-        keyboard = create_content_type_keyboard(current_url)
-        content_selection_text = MessageTemplates.content_type_selection(video_info)
+        keyboard = create_content_type_keyboard(session.token)
+        content_selection_text = MessageTemplates.content_type_selection(session.info)
         
         await safe_edit_message(query, content_selection_text, keyboard)
         
-        logger.info(f"User {user_id} went back to content type selection")
+        logger.info("User %s went back to content type selection", user_id)
         
     except Exception as e:
-        logger.error(f"Back callback error for user {user_id}: {e}")
+        logger.error("Back callback error for user %s: %s", user_id, e)
         error_text = "❌ An error occurred. Please try again with /download"
         keyboard = create_main_menu_keyboard()
         await safe_edit_message(query, error_text, keyboard)
@@ -192,25 +198,28 @@ async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Cancel callback from user {user_id}")
+    logger.info("Cancel callback from user %s", user_id)
     
-    # Clear user data
-    context.user_data.clear()
+    # Clear user data (skip the traversal when nothing is stored)
+    user_data = context.user_data
+    if user_data:
+        user_data.clear()
     
     cancel_text = "❌ <b>Download cancelled.</b>\n\nYou can start a new download with /download"
     keyboard = create_main_menu_keyboard()
     await safe_edit_message(query, cancel_text, keyboard)
 
-async def start_download(query, url: str, content_type: str, quality: str,
-                        video_info: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def start_download(query, session, content_type: str, quality: str,
+                        context: ContextTypes.DEFAULT_TYPE) -> None:
     """Start the download process"""
     user_id = query.from_user.id
+    url = session.url
     
-    logger.info(f"Starting {content_type} download for user {user_id}: {quality}")
+    logger.info("Starting %s download for user %s: %s", content_type, user_id, quality)
     
+    progress_tracker = None
     try:
         # Check and consume rate limit at download start
-        from utils.rate_limiter import rate_limiter
         is_allowed, reset_time = rate_limiter.is_allowed(user_id)
         if not is_allowed:
             rate_limit_text = MessageTemplates.rate_limit_message(reset_time)
@@ -218,23 +227,29 @@ async def start_download(query, url: str, content_type: str, quality: str,
             await safe_edit_message(query, rate_limit_text, keyboard)
             return
         
-        # Update message to show download starting
-        download_starting_text = MessageTemplates.download_starting(content_type, quality)
-        await query.edit_message_text(download_starting_text, parse_mode='HTML')
-        
-        # Create progress tracker
+        # Create progress tracker; its first heartbeat doubles as the
+        # "download starting" notice, saving a separate edit round-trip
         progress_tracker = ProgressTracker(query.message, context.bot)
         
         # Start download
+        # Reuse the raw metadata from the preview extraction when it is
+        # still cached, so yt-dlp skips its second page fetch
         result = await downloader.download_content(
             url=url,
             content_type=content_type,
             quality=quality,
-            progress_callback=progress_tracker.progress_hook
+            progress_callback=progress_tracker.progress_hook,
+            info=validator.get_cached_raw_info(url)
         )
         
-        # Upload to Telegram
-        caption = f"🎬 {result['title']}\n👤 {result['uploader']}"
+        # Upload to Telegram; the media message carries the completion
+        # summary as its caption and the navigation keyboard as its markup,
+        # so no separate completion edit is needed
+        caption = (
+            f"🎬 {result['title']}\n"
+            f"👤 {result['uploader']}\n"
+            f"📊 {format_filesize(result['filesize'])}"
+        )
         if len(caption) > 1024:  # Telegram caption limit
             caption = caption[:1021] + "..."
         
@@ -243,43 +258,87 @@ async def start_download(query, url: str, content_type: str, quality: str,
             chat_id=query.message.chat_id,
             file_path=result['filename'],
             content_type=content_type,
-            caption=caption
+            caption=caption,
+            reply_markup=create_completion_keyboard()
         )
         
-        # Send completion message with navigation buttons
-        completion_text = MessageTemplates.download_complete(
-            filename=result['title'],
-            filesize=result['filesize'],
-            content_type=content_type
-        )
-        
-        completion_keyboard = create_completion_keyboard()
-        await safe_edit_message(query, completion_text, completion_keyboard)
+        # Drop the progress message instead of editing it to "complete"
+        await safe_delete_message(context.bot, query.message.chat_id, query.message.message_id)
         
         # Clear user data
         context.user_data.clear()
         
-        logger.info(f"Successfully completed {content_type} download for user {user_id}")
+        logger.info("Successfully completed %s download for user %s", content_type, user_id)
         
     except ValueError as e:
         # Handle expected errors - refund rate limit on failure
-        from utils.rate_limiter import rate_limiter
         rate_limiter.refund_request(user_id)
         
         error_message = f"❌ {str(e)}"
-        keyboard = create_retry_keyboard(url)
+        keyboard = create_retry_keyboard(session.token)
         await safe_edit_message(query, error_message, keyboard)
-        logger.warning(f"Download failed for user {user_id}: {str(e)}")
+        logger.warning("Download failed for user %s: %s", user_id, e)
         
     except Exception as e:
         # Handle unexpected errors - refund rate limit on failure
-        from utils.rate_limiter import rate_limiter
         rate_limiter.refund_request(user_id)
         
         error_message = "❌ Download failed due to an unexpected error. Please try again."
-        keyboard = create_retry_keyboard(url)
+        keyboard = create_retry_keyboard(session.token)
         await safe_edit_message(query, error_message, keyboard)
-        logger.error(f"Unexpected download error for user {user_id}: {e}")
+        logger.error("Unexpected download error for user %s: %s", user_id, e)
+        
+    finally:
+        # Stop the edit worker so no stale progress frame lands after the
+        # final state (media message or error) is already on screen
+        if progress_tracker is not None:
+            progress_tracker.close()
+
+async def _show_download(query, context) -> None:
+    """Show download prompt with waiting message"""
+    download_text = MessageTemplates.waiting_for_link_message
+    keyboard = create_cancel_keyboard()
+    await safe_edit_message(query, download_text, keyboard)
+
+async def _show_help(query, context) -> None:
+    """Show help message"""
+    help_text = MessageTemplates.help_message
+    keyboard = create_help_keyboard()
+    await safe_edit_message(query, help_text, keyboard)
+
+async def _show_stats(query, context) -> None:
+    """Show user stats (simplified version)"""
+    user_id = query.from_user.id
+    try:
+        remaining = rate_limiter.get_remaining_requests(user_id)
+        stats_text = (
+            f"📊 <b>Your Statistics</b>\n\n"
+            f"⏳ <b>Remaining downloads:</b> {remaining}/5 this hour\n"
+            f"🔄 <b>Rate limit:</b> 5 downloads per hour\n"
+            f"📁 <b>Max file size:</b> 50MB\n\n"
+            f"💡 <b>Tip:</b> Audio files are much smaller than videos!"
+        )
+        keyboard = create_stats_keyboard()
+        await safe_edit_message(query, stats_text, keyboard)
+    except Exception as e:
+        logger.error("Stats error: %s", e)
+        error_text = "❌ Failed to retrieve statistics."
+        keyboard = create_main_menu_keyboard()
+        await safe_edit_message(query, error_text, keyboard)
+
+async def _show_main(query, context) -> None:
+    """Show main menu"""
+    main_menu_text = MessageTemplates.main_menu_message
+    keyboard = create_main_menu_keyboard()
+    await safe_edit_message(query, main_menu_text, keyboard)
+
+# Constant-time menu dispatch instead of an if/elif ladder
+_MENU_DISPATCH = {
+    "download": _show_download,
+    "help": _show_help,
+    "stats": _show_stats,
+    "main": _show_main,
+}
 
 async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle main menu callbacks"""
@@ -289,52 +348,16 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Menu callback from user {user_id}: {query.data}")
+    logger.info("Menu callback from user %s: %s", user_id, query.data)
     
     try:
-        menu_action = query.data.split('_')[1]  # Extract action from callback_data
-        
-        if menu_action == "download":
-            # Show download prompt with waiting message
-            download_text = MessageTemplates.waiting_for_link_message()
-            keyboard = create_cancel_keyboard()
-            await safe_edit_message(query, download_text, keyboard)
-            
-        elif menu_action == "help":
-            # Show help message
-            help_text = MessageTemplates.help_message()
-            keyboard = create_help_keyboard()
-            await safe_edit_message(query, help_text, keyboard)
-            
-        elif menu_action == "stats":
-            # Show user stats (simplified version)
-            try:
-                from utils.rate_limiter import rate_limiter
-                remaining = rate_limiter.get_remaining_requests(user_id)
-                stats_text = (
-                    f"📊 <b>Your Statistics</b>\n\n"
-                    f"⏳ <b>Remaining downloads:</b> {remaining}/5 this hour\n"
-                    f"🔄 <b>Rate limit:</b> 5 downloads per hour\n"
-                    f"📁 <b>Max file size:</b> 50MB\n\n"
-                    f"💡 <b>Tip:</b> Audio files are much smaller than videos!"
-                )
-                from utils.keyboards import create_stats_keyboard
-                keyboard = create_stats_keyboard()
-                await safe_edit_message(query, stats_text, keyboard)
-            except Exception as e:
-                logger.error(f"Stats error: {e}")
-                error_text = "❌ Failed to retrieve statistics."
-                keyboard = create_main_menu_keyboard()
-                await safe_edit_message(query, error_text, keyboard)
-                
-        elif menu_action == "main":
-            # Show main menu
-            main_menu_text = MessageTemplates.main_menu_message()
-            keyboard = create_main_menu_keyboard()
-            await safe_edit_message(query, main_menu_text, keyboard)
+        menu_action = query.data.partition('_')[2]  # Extract action without a list allocation
+        handler = _MENU_DISPATCH.get(menu_action)
+        if handler:
+            await handler(query, context)
             
     except Exception as e:
-        logger.error(f"Menu callback error for user {user_id}: {e}")
+        logger.error("Menu callback error for user %s: %s", user_id, e)
         error_text = "❌ An error occurred. Please try again."
         keyboard = create_main_menu_keyboard()
         await safe_edit_message(query, error_text, keyboard)
@@ -347,51 +370,49 @@ async def retry_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user = update.effective_user
     user_id = user.id
     
-    logger.info(f"Retry callback from user {user_id}: {query.data}")
+    logger.info("Retry callback from user %s: %s", user_id, query.data)
     
     try:
-        # Parse callback data
-        callback_data = query.data
-        parts = callback_data.split('_')
+        # Parse callback data with the precompiled pattern
+        match = _RETRY_RE.match(query.data)
         
-        if len(parts) != 2 or parts[0] != 'retry':
+        if match is None:
             error_text = "❌ Invalid retry request."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        url_hash = parts[1]
+        token = match.group(1)
         
-        # Get stored data
-        video_info = context.user_data.get('video_info')
-        current_url = context.user_data.get('current_url')
+        # Get stored session with a single lookup
+        session = context.user_data.get('session')
         
-        if not video_info or not current_url:
+        if session is None:
             error_text = "❌ Session expired. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
-        # Verify URL hash
-        if str(hash(current_url) % 10000) != url_hash:
+        # Verify session token
+        if session.token != token:
             error_text = "❌ Invalid session. Please use /download again."
             keyboard = create_main_menu_keyboard()
             await safe_edit_message(query, error_text, keyboard)
             return
         
         # Clear previous selections and start over
-        context.user_data.pop('content_type', None)
+        session.content_type = None
         
         # Show content type selection again
-        keyboard = create_content_type_keyboard(current_url)
-        content_selection_text = MessageTemplates.content_type_selection(video_info)
+        keyboard = create_content_type_keyboard(session.token)
+        content_selection_text = MessageTemplates.content_type_selection(session.info)
         
         await safe_edit_message(query, content_selection_text, keyboard)
         
-        logger.info(f"User {user_id} retrying download")
+        logger.info("User %s retrying download", user_id)
         
     except Exception as e:
-        logger.error(f"Retry callback error for user {user_id}: {e}")
+        logger.error("Retry callback error for user %s: %s", user_id, e)
         error_text = "❌ An error occurred. Please try again with /download"
         keyboard = create_main_menu_keyboard()
         await safe_edit_message(query, error_text, keyboard)
@@ -419,7 +440,7 @@ async def safe_edit_message(query, text: str, keyboard=None, delete_previous=Fal
                     # Update the query message reference for future operations
                     query.message = new_message
                 except Exception as delete_error:
-                    logger.warning(f"Failed to delete previous message: {delete_error}")
+                    logger.warning("Failed to delete previous message: %s", delete_error)
                     # Fallback to editing
                     await query.edit_message_text(
                         text,
@@ -437,7 +458,7 @@ async def safe_edit_message(query, text: str, keyboard=None, delete_previous=Fal
             logger.debug("Message content unchanged, skipping edit")
             
     except Exception as e:
-        logger.error(f"Safe edit message failed: {e}")
+        logger.error("Safe edit message failed: %s", e)
         # Fallback: try to send a new message if editing fails
         try:
             await query.message.reply_text(
@@ -446,7 +467,7 @@ async def safe_edit_message(query, text: str, keyboard=None, delete_previous=Fal
                 parse_mode='HTML'
             )
         except Exception as fallback_error:
-            logger.error(f"Fallback message send failed: {fallback_error}")
+            logger.error("Fallback message send failed: %s", fallback_error)
 
 async def safe_delete_and_send(bot, chat_id: int, message_id: int, text: str, keyboard=None):
     """Delete a message and send a new one"""
@@ -462,7 +483,7 @@ async def safe_delete_and_send(bot, chat_id: int, message_id: int, text: str, ke
             parse_mode='HTML'
         )
     except Exception as e:
-        logger.warning(f"Failed to delete and send message: {e}")
+        logger.warning("Failed to delete and send message: %s", e)
         # Fallback: just send the new message
         return await bot.send_message(
             chat_id=chat_id,
@@ -475,37 +496,17 @@ def setup_callback_handlers(application) -> None:
     """Set up all callback handlers"""
     logger.info("Setting up callback handlers")
     
-    # Add callback handlers with pattern matching
-    application.add_handler(CallbackQueryHandler(
-        content_type_callback, 
-        pattern=r'^type_(video|audio)_\d+$'
-    ))
-    
-    application.add_handler(CallbackQueryHandler(
-        quality_callback, 
-        pattern=r'^quality_(video|audio)_\w+_\d+$'
-    ))
-    
-    application.add_handler(CallbackQueryHandler(
-        back_callback, 
-        pattern=r'^back_type_\d+$'
-    ))
-    
-    application.add_handler(CallbackQueryHandler(
-        cancel_callback,
-        pattern=r'^cancel$'
-    ))
+    # Register the same compiled patterns the callbacks use for parsing,
+    # so each pattern exists exactly once
+    application.add_handler(CallbackQueryHandler(content_type_callback, pattern=_TYPE_RE))
+    application.add_handler(CallbackQueryHandler(quality_callback, pattern=_QUALITY_RE))
+    application.add_handler(CallbackQueryHandler(back_callback, pattern=_BACK_RE))
+    application.add_handler(CallbackQueryHandler(cancel_callback, pattern=_CANCEL_RE))
     
-    # Add menu callback handlers
-    application.add_handler(CallbackQueryHandler(
-        menu_callback,
-        pattern=r'^menu_(download|help|stats|main)$'
-    ))
+    # Add menu callback handler
+    application.add_handler(CallbackQueryHandler(menu_callback, pattern=_MENU_RE))
     
     # Add retry callback handler
-    application.add_handler(CallbackQueryHandler(
-        retry_callback,
-        pattern=r'^retry_\d+$'
-    ))
+    application.add_handler(CallbackQueryHandler(retry_callback, pattern=_RETRY_RE))
     
     logger.info("Callback handlers set up successfully")
\ No newline at end of file
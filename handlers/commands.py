@@ -2,28 +2,71 @@
 Command handlers for the Telegram Video Downloader Bot
 """
 
+import asyncio
 import logging
 import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from services.validator import validator
 from utils.messages import MessageTemplates
 from utils.keyboards import create_content_type_keyboard, create_main_menu_keyboard
 from utils.rate_limiter import rate_limiter
+from utils.session import Session, next_session_token
 
 logger = logging.getLogger(__name__)
 
-# URL pattern for detecting video URLs
-URL_PATTERN = re.compile(
-    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-)
+# Rendered once; every URL message sends this
+_PROCESSING_HTML = MessageTemplates.processing_url
+
+# URL pattern for detecting video URLs. Kept deliberately simple: a single
+# linear scan with no nested quantifiers or character-class ranges, so the
+# regex engine cannot backtrack pathologically on hostile message text.
+URL_PATTERN = re.compile(r'https?://\S+')
+
+class _MaybeURL(filters.MessageFilter):
+    """Cheap substring gate: skips the regex scan for URL-free messages"""
+    __slots__ = ()
+    
+    def filter(self, message):
+        text = message.text
+        return bool(text) and ('http://' in text or 'https://' in text)
+
+MAYBE_URL = _MaybeURL()
+
+# Debounce window for coalescing rapid-fire URL messages per chat
+URL_DEBOUNCE_SECONDS = 0.25
+
+# Latest pending (update, context, url) per chat and its flush timer
+_pending_urls = {}
+_pending_timers = {}
+
+# Strong references to in-flight flush tasks — asyncio only keeps weak
+# ones, so without this a flush could be garbage-collected mid-run
+_flush_tasks = set()
+
+# Query parameters that only carry tracking state and never change the video
+_TRACKING_PARAMS = frozenset({'fbclid', 'si'})
+
+def _normalize_url(url: str) -> str:
+    """Canonicalize a URL so equivalent links share one cache entry"""
+    parts = urlsplit(url)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in _TRACKING_PARAMS and not key.startswith('utm_')
+    ]
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path,
+        urlencode(query), ''
+    ))
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command"""
     user = update.effective_user
-    logger.info(f"Start command from user {user.id} ({user.username})")
+    logger.info("Start command from user %s (%s)", user.id, user.username)
     
-    welcome_text = MessageTemplates.welcome_message()
+    welcome_text = MessageTemplates.welcome_message
     keyboard = create_main_menu_keyboard()
     await update.message.reply_text(
         welcome_text,
@@ -34,57 +77,46 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /help command"""
     user = update.effective_user
-    logger.info(f"Help command from user {user.id} ({user.username})")
+    logger.info("Help command from user %s (%s)", user.id, user.username)
     
-    help_text = MessageTemplates.help_message()
+    help_text = MessageTemplates.help_message
     await update.message.reply_text(help_text, parse_mode='HTML')
 
-async def download_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle /download command"""
-    user = update.effective_user
-    user_id = user.id
-    
-    logger.info(f"Download command from user {user_id} ({user.username})")
-    
-    # Check rate limit but don't consume it yet
-    remaining = rate_limiter.get_remaining_requests(user_id)
-    if remaining <= 0:
-        reset_time = rate_limiter.get_reset_time(user_id)
-        rate_limit_text = MessageTemplates.rate_limit_message(reset_time)
-        await update.message.reply_text(rate_limit_text, parse_mode='HTML')
-        return
-    
-    # Check if URL is provided
-    if not context.args:
-        invalid_url_text = MessageTemplates.invalid_url_message()
-        await update.message.reply_text(invalid_url_text, parse_mode='HTML')
-        return
-    
-    url = context.args[0]
-    logger.info(f"Processing URL: {url}")
-    
-    # Show processing message
-    processing_msg = await update.message.reply_text(
-        MessageTemplates.processing_url(),
-        parse_mode='HTML'
-    )
-    
+async def _process_url(processing_msg, context: ContextTypes.DEFAULT_TYPE,
+                       url: str, user_id: int) -> None:
+    """Shared URL pipeline: validate, extract info, and offer content types"""
     try:
+        # Canonicalize the URL so equivalent links share one cache entry
+        url = _normalize_url(url)
+        
+        # Kick off the network-bound extraction speculatively; the format
+        # check below is pure CPU, so on the common (valid) path the first
+        # RTT of extract_info overlaps with it for free. The validator
+        # caches results per URL, so repeats are served from memory.
+        extract_task = asyncio.create_task(validator.extract_info(url))
+
         # Validate URL format
         is_valid, message = validator.validate_format(url)
         if not is_valid:
+            extract_task.cancel()
             await processing_msg.edit_text(message, parse_mode='HTML')
             return
         
-        # Extract video information
-        video_info = await validator.extract_info(url)
+        # The keyboard only depends on the session token, not on the
+        # extraction result, so build it (cheap, lru-cached — no executor
+        # dispatch warranted) while extract_info is still on the wire
+        token = next_session_token()
+        keyboard = create_content_type_keyboard(token)
         
-        # Store URL in user data for callback handlers
-        context.user_data['current_url'] = url
-        context.user_data['video_info'] = video_info
+        # Extract video information (cached for repeated URLs)
+        video_info = await extract_task
         
-        # Create content type selection keyboard
-        keyboard = create_content_type_keyboard(url)
+        # Store session state in a single user_data key for callback handlers
+        context.user_data['session'] = Session(
+            url=url,
+            info=video_info,
+            token=token
+        )
         
         # Update message with video info and content type selection
         content_selection_text = MessageTemplates.content_type_selection(video_info)
@@ -94,19 +126,52 @@ async def download_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             parse_mode='HTML'
         )
         
-        logger.info(f"Successfully processed URL for user {user_id}: {video_info['title']}")
+        logger.info("Successfully processed URL for user %s: %s", user_id, video_info['title'])
         
     except ValueError as e:
         # Handle validation/extraction errors
         error_message = str(e)
         await processing_msg.edit_text(error_message, parse_mode='HTML')
-        logger.warning(f"URL processing failed for user {user_id}: {error_message}")
+        logger.warning("URL processing failed for user %s: %s", user_id, error_message)
         
     except Exception as e:
         # Handle unexpected errors
-        error_message = f"❌ An unexpected error occurred. Please try again later."
+        error_message = "❌ An unexpected error occurred. Please try again later."
         await processing_msg.edit_text(error_message, parse_mode='HTML')
-        logger.error(f"Unexpected error in download command for user {user_id}: {e}")
+        logger.error("Unexpected error while processing URL for user %s: %s", user_id, e)
+
+async def download_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /download command"""
+    user = update.effective_user
+    user_id = user.id
+    
+    logger.info("Download command from user %s (%s)", user_id, user.username)
+    
+    # Check rate limit but don't consume it yet (single scan for both values)
+    allowed, reset_time = rate_limiter.peek(user_id)
+    if not allowed:
+        rate_limit_text = MessageTemplates.rate_limit_message(reset_time)
+        await update.message.reply_text(rate_limit_text, parse_mode='HTML')
+        return
+    
+    # Check if URL is provided (context.args re-splits the message text on
+    # every property access, so read it once)
+    args = context.args
+    if not args:
+        invalid_url_text = MessageTemplates.invalid_url_message
+        await update.message.reply_text(invalid_url_text, parse_mode='HTML')
+        return
+    
+    url = args[0]
+    logger.info("Processing URL: %s", url)
+    
+    # Show processing message
+    processing_msg = await update.message.reply_text(
+        _PROCESSING_HTML,
+        parse_mode='HTML'
+    )
+    
+    await _process_url(processing_msg, context, url, user_id)
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /stats command (admin only)"""
@@ -115,7 +180,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     
     # Simple admin check (you can implement proper admin system)
     # For now, just log the request
-    logger.info(f"Stats command from user {user_id} ({user.username})")
+    logger.info("Stats command from user %s (%s)", user_id, user.username)
     
     try:
         # Get rate limiter stats
@@ -132,7 +197,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text(stats_text, parse_mode='HTML')
         
     except Exception as e:
-        logger.error(f"Stats command error: {e}")
+        logger.error("Stats command error: %s", e)
         await update.message.reply_text(
             "❌ Failed to retrieve statistics.",
             parse_mode='HTML'
@@ -141,7 +206,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /cancel command"""
     user = update.effective_user
-    logger.info(f"Cancel command from user {user.id} ({user.username})")
+    logger.info("Cancel command from user %s (%s)", user.id, user.username)
     
     # Clear user data
     context.user_data.clear()
@@ -157,13 +222,13 @@ async def url_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = user.id
     message_text = update.message.text
     
-    logger.info(f"URL message from user {user_id} ({user.username}): {message_text}")
+    logger.info("URL message from user %s (%s): %s", user_id, user.username, message_text)
     
     # Extract URL from message
     urls = URL_PATTERN.findall(message_text)
     if not urls:
         # If no URL found, show help message
-        help_text = MessageTemplates.no_url_found_message()
+        help_text = MessageTemplates.no_url_found_message
         keyboard = create_main_menu_keyboard()
         await update.message.reply_text(
             help_text,
@@ -173,65 +238,65 @@ async def url_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     url = urls[0]  # Use the first URL found
+    del urls
     
-    # Check rate limit but don't consume it yet
-    remaining = rate_limiter.get_remaining_requests(user_id)
-    if remaining <= 0:
-        reset_time = rate_limiter.get_reset_time(user_id)
+    # Check rate limit but don't consume it yet (single scan for both values)
+    allowed, reset_time = rate_limiter.peek(user_id)
+    if not allowed:
         rate_limit_text = MessageTemplates.rate_limit_message(reset_time)
         await update.message.reply_text(rate_limit_text, parse_mode='HTML')
         return
     
-    # Delete the user's message to reduce clutter
-    try:
-        await update.message.delete()
-    except Exception as e:
-        logger.warning(f"Failed to delete user message: {e}")
+    # Debounce rapid-fire links: keep only the latest URL per chat and
+    # process it once the burst settles, so pasting several links costs a
+    # single extraction + keyboard render instead of one per message
+    chat_id = update.effective_chat.id
+    _pending_urls[chat_id] = (update, context, url)
     
-    # Show processing message
-    processing_msg = await update.message.reply_text(
-        MessageTemplates.processing_url(),
-        parse_mode='HTML'
+    timer = _pending_timers.pop(chat_id, None)
+    if timer is not None:
+        timer.cancel()
+    
+    loop = asyncio.get_running_loop()
+    _pending_timers[chat_id] = loop.call_later(
+        URL_DEBOUNCE_SECONDS,
+        _start_flush, chat_id
     )
+
+def _start_flush(chat_id: int) -> None:
+    """Kick off the flush task, holding a reference until it finishes"""
+    task = asyncio.get_running_loop().create_task(_flush_pending_url(chat_id))
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+
+async def _flush_pending_url(chat_id: int) -> None:
+    """Process the most recent URL queued for a chat"""
+    _pending_timers.pop(chat_id, None)
+    pending = _pending_urls.pop(chat_id, None)
+    if pending is None:
+        return
     
-    try:
-        # Validate URL format
-        is_valid, message = validator.validate_format(url)
-        if not is_valid:
-            await processing_msg.edit_text(message, parse_mode='HTML')
-            return
-        
-        # Extract video information
-        video_info = await validator.extract_info(url)
-        
-        # Store URL in user data for callback handlers
-        context.user_data['current_url'] = url
-        context.user_data['video_info'] = video_info
-        
-        # Create content type selection keyboard
-        keyboard = create_content_type_keyboard(url)
-        
-        # Update message with video info and content type selection
-        content_selection_text = MessageTemplates.content_type_selection(video_info)
-        await processing_msg.edit_text(
-            content_selection_text,
-            reply_markup=keyboard,
-            parse_mode='HTML'
-        )
-        
-        logger.info(f"Successfully processed URL for user {user_id}: {video_info['title']}")
-        
-    except ValueError as e:
-        # Handle validation/extraction errors
-        error_message = str(e)
-        await processing_msg.edit_text(error_message, parse_mode='HTML')
-        logger.warning(f"URL processing failed for user {user_id}: {error_message}")
-        
-    except Exception as e:
-        # Handle unexpected errors
-        error_message = f"❌ An unexpected error occurred. Please try again later."
-        await processing_msg.edit_text(error_message, parse_mode='HTML')
-        logger.error(f"Unexpected error in URL handler for user {user_id}: {e}")
+    update, context, url = pending
+    user_id = update.effective_user.id
+    
+    # Send the processing notice and delete the user's message (to reduce
+    # clutter) in one parallel round-trip; the delete is off the critical
+    # path and its failure is non-fatal
+    processing_msg, delete_result = await asyncio.gather(
+        update.message.reply_text(_PROCESSING_HTML, parse_mode='HTML'),
+        update.message.delete(),
+        return_exceptions=True
+    )
+    if isinstance(processing_msg, Exception):
+        # This task runs outside PTB's dispatch, so raising here would
+        # never reach error_handler — it would only show up as an
+        # unretrieved task exception at GC time. Log and stop instead.
+        logger.error("Failed to send processing notice: %s", processing_msg)
+        return
+    if isinstance(delete_result, Exception):
+        logger.warning("Failed to delete user message: %s", delete_result)
+    
+    await _process_url(processing_msg, context, url, user_id)
 
 def setup_command_handlers(application) -> None:
     """Set up all command handlers"""
@@ -244,9 +309,10 @@ def setup_command_handlers(application) -> None:
     application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("cancel", cancel_command))
     
-    # Add URL message handler (for messages containing URLs)
+    # Add URL message handler (for messages containing URLs); the substring
+    # gate rejects the no-URL majority before any regex work happens
     application.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND & filters.Regex(URL_PATTERN),
+        filters.TEXT & ~filters.COMMAND & MAYBE_URL,
         url_message_handler
     ))
     
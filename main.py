@@ -4,16 +4,30 @@ Telegram Video Downloader Bot
 Entry point for the application
 """
 
-import asyncio
 import logging
 import sys
-from logging.handlers import RotatingFileHandler
-from telegram.ext import Application
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from telegram.ext import AIORateLimiter, Application
+from telegram.request import HTTPXRequest
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 from config import Config
 from handlers.commands import setup_command_handlers
 from handlers.callbacks import setup_callback_handlers
 from utils.helpers import validate_bot_token
+from utils.rate_limiter import start_clock
+from utils.session import SESSION_SWEEP_INTERVAL, sweep_stale_sessions
+
+logger = logging.getLogger(__name__)
+
+async def _post_init(application) -> None:
+    """Start background helpers once the event loop is running"""
+    start_clock()
 
 def setup_logging():
     """Configure logging for the application"""
@@ -35,51 +49,57 @@ def setup_logging():
             # If encoding setup fails, continue without it
             pass
     
-    # Configure logging with error handling
+    # Build the blocking sink handlers
     try:
-        logging.basicConfig(
-            level=getattr(logging, Config.LOG_LEVEL),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                RotatingFileHandler(
-                    'logs/bot.log',
-                    maxBytes=10*1024*1024,  # 10MB
-                    backupCount=5,
-                    encoding='utf-8'
-                ),
-                logging.StreamHandler(sys.stdout)
-            ]
+        file_handler = RotatingFileHandler(
+            'logs/bot.log',
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5,
+            encoding='utf-8'
         )
     except Exception as e:
-        # Fallback to basic logging if UTF-8 setup fails
-        logging.basicConfig(
-            level=getattr(logging, Config.LOG_LEVEL),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                RotatingFileHandler(
-                    'logs/bot.log',
-                    maxBytes=10*1024*1024,  # 10MB
-                    backupCount=5
-                ),
-                logging.StreamHandler(sys.stdout)
-            ]
+        # Fallback without explicit encoding if UTF-8 setup fails
+        file_handler = RotatingFileHandler(
+            'logs/bot.log',
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5
         )
         print(f"Warning: UTF-8 logging setup failed: {e}")
     
+    stream_handler = logging.StreamHandler(sys.stdout)
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    stream_handler.setFormatter(formatter)
+    
+    # Handlers only see records via an in-memory queue; the listener thread
+    # does the blocking file/stream I/O so the event loop never stalls on
+    # disk writes or log rotation
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, file_handler, stream_handler,
+        respect_handler_level=True
+    )
+    listener.start()
+    
+    logging.basicConfig(
+        level=getattr(logging, Config.LOG_LEVEL),
+        handlers=[QueueHandler(log_queue)]
+    )
+    
     # Reduce noise from external libraries
     logging.getLogger('httpx').setLevel(logging.WARNING)
     logging.getLogger('telegram').setLevel(logging.WARNING)
     logging.getLogger('yt_dlp').setLevel(logging.WARNING)
     
-    logger = logging.getLogger(__name__)
     logger.info("Logging configured successfully")
-    return logger
+    return listener
 
-async def main():
+def main():
     """Main function to start the bot"""
     
     # Setup logging
-    logger = setup_logging()
+    log_listener = setup_logging()
     
     try:
         # Validate bot token
@@ -93,8 +113,32 @@ async def main():
         logger.info(f"Rate limit: {Config.MAX_DOWNLOADS_PER_HOUR} downloads/hour")
         logger.info(f"Temp directory: {Config.TEMP_DIR}")
         
-        # Create application
-        application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+        # Create application with a client-side rate limiter and enough
+        # connection-pool headroom to parallelize outgoing API calls.
+        # HTTP/2 multiplexes the bursts of edit/send/delete calls to
+        # api.telegram.org over one TLS connection.
+        api_request = HTTPXRequest(
+            connection_pool_size=Config.CONNECTION_POOL_SIZE,
+            http_version="2",
+            connect_timeout=10.0,
+            read_timeout=30.0,
+            write_timeout=30.0,
+            pool_timeout=30.0,
+        )
+        polling_request = HTTPXRequest(
+            connection_pool_size=16,
+            http_version="2",
+        )
+        application = (
+            Application.builder()
+            .token(Config.TELEGRAM_BOT_TOKEN)
+            .rate_limiter(AIORateLimiter(max_retries=3))
+            .concurrent_updates(Config.CONCURRENT_UPDATES)
+            .request(api_request)
+            .get_updates_request(polling_request)
+            .post_init(_post_init)
+            .build()
+        )
         
         # Setup handlers
         setup_command_handlers(application)
@@ -103,44 +147,34 @@ async def main():
         # Add error handler
         application.add_error_handler(error_handler)
         
-        logger.info("Bot handlers configured successfully")
+        # Periodically evict stale sessions so user_data stays bounded
+        application.job_queue.run_repeating(
+            sweep_stale_sessions,
+            interval=SESSION_SWEEP_INTERVAL,
+            first=SESSION_SWEEP_INTERVAL
+        )
         
-        # Initialize the application
-        await application.initialize()
+        logger.info("Bot handlers configured successfully")
         
-        # Start the bot
+        # run_polling owns the event loop, signal handlers and the full
+        # initialize/start/stop/shutdown sequence
         logger.info("Bot is starting... Press Ctrl+C to stop")
-        await application.start()
-        await application.updater.start_polling(
-            allowed_updates=['message', 'callback_query'],
+        application.run_polling(
+            allowed_updates=list(Config.ALLOWED_UPDATES),
             drop_pending_updates=True
         )
         
-        # Keep the bot running
-        try:
-            await asyncio.Event().wait()
-        except KeyboardInterrupt:
-            logger.info("Bot stopped by user")
-        
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         raise
     finally:
-        # Properly shutdown the application
-        try:
-            if 'application' in locals():
-                await application.updater.stop()
-                await application.stop()
-                await application.shutdown()
-        except Exception as e:
-            logger.error(f"Error during shutdown: {e}")
+        # Flush queued log records before the process exits
+        log_listener.stop()
 
 async def error_handler(update, context):
     """Global error handler"""
-    logger = logging.getLogger(__name__)
-    
     try:
         # Log the error
         logger.error(f"Exception while handling update {update}: {context.error}")
@@ -165,28 +199,17 @@ async def error_handler(update, context):
 
 def check_dependencies():
     """Check if all required dependencies are available"""
-    logger = logging.getLogger(__name__)
-    
-    try:
-        import yt_dlp
-        logger.info(f"yt-dlp version: {yt_dlp.version.__version__}")
-    except ImportError:
-        logger.error("yt-dlp not found. Please install it with: pip install yt-dlp")
-        return False
-    
-    try:
-        import telegram
-        logger.info(f"python-telegram-bot version: {telegram.__version__}")
-    except ImportError:
-        logger.error("python-telegram-bot not found. Please install it with: pip install python-telegram-bot")
-        return False
+    # Query installed-package metadata instead of importing the modules:
+    # importing yt_dlp alone pulls in hundreds of extractor modules, and
+    # the app imports everything it needs lazily later anyway
+    from importlib import metadata
     
-    try:
-        import dotenv
-        logger.info("python-dotenv available")
-    except ImportError:
-        logger.error("python-dotenv not found. Please install it with: pip install python-dotenv")
-        return False
+    for package in ('yt-dlp', 'python-telegram-bot', 'python-dotenv'):
+        try:
+            logger.info("%s version: %s", package, metadata.version(package))
+        except metadata.PackageNotFoundError:
+            logger.error("%s not found. Please install it with: pip install %s", package, package)
+            return False
     
     # Check for FFmpeg (optional but recommended for audio)
     import shutil
@@ -217,41 +240,20 @@ def print_startup_banner():
     print(banner)
 
 def run_bot():
-    """Run the bot with proper event loop handling"""
-    try:
-        # Try to get existing event loop
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If loop is already running, create a new one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        # No event loop exists, create a new one
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    """Run the bot"""
+    # Use the libuv-backed event loop when available (faster socket I/O
+    # and task scheduling); silently fall back to the stdlib loop.
+    # Application.run_polling creates and tears down the loop itself.
+    if uvloop is not None:
+        uvloop.install()
     
     try:
-        loop.run_until_complete(main())
+        main()
     except KeyboardInterrupt:
         print("\n👋 Bot stopped by user. Goodbye!")
     except Exception as e:
         print(f"❌ Fatal error: {e}")
         sys.exit(1)
-    finally:
-        try:
-            # Cancel all running tasks
-            pending = asyncio.all_tasks(loop)
-            for task in pending:
-                task.cancel()
-            
-            # Wait for all tasks to complete
-            if pending:
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            
-            # Close the loop
-            loop.close()
-        except Exception as e:
-            print(f"Error during cleanup: {e}")
 
 if __name__ == '__main__':
     # Print startup banner
@@ -4,37 +4,83 @@ Video and audio download service using yt-dlp
 
 import os
 import asyncio
+import copy
 import logging
+import aiofiles
 import yt_dlp
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Optional, Callable
-from config import Config, DOWNLOAD_OPTIONS
-from utils.helpers import cleanup_file, get_file_size, is_file_too_large, sanitize_filename
+from config import Config, DOWNLOAD_OPTIONS_FLAT
+from utils.helpers import cleanup_file, sanitize_filename, stat_or_none
 
 logger = logging.getLogger(__name__)
 
+# All 11 progress-bar states, prerendered; the hot hook just indexes
+_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
+@lru_cache(maxsize=32)
+def _build_ydl_opts(content_type: str, quality: str) -> Optional[Dict]:
+    """Merge base yt-dlp options with the (content_type, quality) overrides.
+    
+    Memoized: the merge result never changes for a given pair, so repeat
+    downloads skip the dict copy and per-key writes. Returns None for an
+    unknown pair. Callers must copy before adding per-call entries.
+    """
+    options = DOWNLOAD_OPTIONS_FLAT.get((content_type, quality))
+    if options is None:
+        return None
+    
+    ydl_opts = dict(Config.YT_DLP_OPTIONS)
+    ydl_opts['format'] = options['format']
+    
+    # Add postprocessors for audio
+    if content_type == 'audio' and 'postprocessors' in options:
+        ydl_opts['postprocessors'] = options['postprocessors']
+        ydl_opts['keepvideo'] = False  # Don't keep original video for audio extraction
+    
+    return ydl_opts
+
 class ProgressTracker:
     """Track download progress and update user"""
     
-    def __init__(self, message, bot, update_interval: int = 10):
+    __slots__ = ('message', 'bot', '_last_decile', 'loop', '_queue', '_worker')
+    
+    # Minimum spacing between Telegram edits, regardless of download speed
+    MIN_EDIT_INTERVAL = 1.0
+    
+    def __init__(self, message, bot):
         self.message = message
         self.bot = bot
-        self.last_update = 0
-        self.update_interval = update_interval  # Update every N percent
-        
+        # Progress is gated per decile (0..10) with a single integer
+        # compare — no float drift accumulating across ticks
+        self._last_decile = -1
+        # yt-dlp fires the hook on its worker thread; edits are funneled
+        # through a one-slot queue drained by a single coroutine on the
+        # loop captured here, so bursts coalesce into the latest state
+        # instead of queueing one API round-trip per hook call
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=1)
+        self._worker = self.loop.create_task(self._drain_edits())
+    
     def progress_hook(self, d):
-        """Progress hook for yt-dlp (synchronous version)"""
+        """Progress hook for yt-dlp (called from the download thread)"""
         if d['status'] == 'downloading':
             try:
-                percent_str = d.get('_percent_str', '0%').strip('%')
-                percent = float(percent_str)
+                # Compute percent from the raw byte counters instead of
+                # stripping and parsing yt-dlp's preformatted string on
+                # every tick
+                downloaded = d.get('downloaded_bytes') or 0
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                percent = downloaded * 100 / total if total else 0
                 
-                # Update every N% to avoid rate limits
-                if percent - self.last_update >= self.update_interval:
+                # Update once per decile to avoid rate limits
+                decile = min(int(percent) // 10, 10)
+                if decile > self._last_decile:
                     speed = d.get('_speed_str', 'N/A')
                     
-                    # Create progress bar
-                    filled = int(percent / 10)
-                    bar = "█" * filled + "░" * (10 - filled)
+                    # Look up the prerendered progress bar
+                    bar = _BARS[decile]
                     
                     text = (
                         f"⬇️ <b>Downloading...</b>\n"
@@ -42,31 +88,40 @@ class ProgressTracker:
                         f"🚀 Speed: {speed}"
                     )
                     
-                    # Schedule the async update
-                    import asyncio
-                    try:
-                        loop = asyncio.get_event_loop()
-                        loop.create_task(self._update_message(text))
-                    except Exception as e:
-                        # If we can't get the loop, just skip the update
-                        pass
-                    
-                    self.last_update = percent
+                    self.loop.call_soon_threadsafe(self._enqueue, text)
+                    self._last_decile = decile
                     
             except Exception as e:
                 logger.warning(f"Progress update failed: {e}")
         
         elif d['status'] == 'finished':
+            text = "✅ <b>Download completed!</b>\n📤 Uploading to Telegram..."
+            self.loop.call_soon_threadsafe(self._enqueue, text)
+    
+    def close(self):
+        """Stop the edit worker once the download is over"""
+        self.loop.call_soon_threadsafe(self._enqueue, None)
+    
+    def _enqueue(self, text):
+        """Replace whatever is pending with the latest state (loop thread)"""
+        while not self._queue.empty():
             try:
-                text = "✅ <b>Download completed!</b>\n📤 Uploading to Telegram..."
-                import asyncio
-                try:
-                    loop = asyncio.get_event_loop()
-                    loop.create_task(self._update_message(text))
-                except Exception:
-                    pass
-            except Exception as e:
-                logger.warning(f"Completion update failed: {e}")
+                self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            pass
+    
+    async def _drain_edits(self):
+        """Single consumer: one in-flight edit, spaced to dodge 429s"""
+        while True:
+            text = await self._queue.get()
+            if text is None:
+                break
+            await self._update_message(text)
+            await asyncio.sleep(self.MIN_EDIT_INTERVAL)
     
     async def _update_message(self, text: str):
         """Helper method to update message asynchronously"""
@@ -84,11 +139,21 @@ class EnhancedVideoDownloader:
     """Enhanced video and audio downloader with progress tracking"""
     
     def __init__(self):
-        self.active_downloads = {}
+        # Tuple keys hash natively — no per-lookup f-string allocation
+        self.active_downloads: set = set()
+        # Explicit pool + semaphore bound the number of simultaneous
+        # yt-dlp jobs (back-pressure), instead of letting the default
+        # executor fan out to min(32, cpu+4) threads with no limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.MAX_CONCURRENT_DOWNLOADS,
+            thread_name_prefix='download'
+        )
+        self._semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_DOWNLOADS)
         logger.info("Enhanced video downloader initialized")
     
     async def download_content(self, url: str, content_type: str, quality: str, 
-                             progress_callback: Optional[Callable] = None) -> Dict:
+                             progress_callback: Optional[Callable] = None,
+                             info: Optional[Dict] = None) -> Dict:
         """
         Download video or extract audio based on content type
         
@@ -97,6 +162,8 @@ class EnhancedVideoDownloader:
             content_type: 'video' or 'audio'
             quality: Quality/format key
             progress_callback: Optional progress callback
+            info: Optional pre-extracted yt-dlp info dict; when given the
+                download reuses it and skips the second extraction
             
         Returns:
             Dictionary with download result information
@@ -104,39 +171,34 @@ class EnhancedVideoDownloader:
         Raises:
             ValueError: If download fails or already in progress
         """
-        download_id = hash(f"{url}_{content_type}_{quality}")
+        download_key = (url, content_type, quality)
         
-        if download_id in self.active_downloads:
+        if download_key in self.active_downloads:
             raise ValueError("Download already in progress for this content")
         
-        self.active_downloads[download_id] = True
+        self.active_downloads.add(download_key)
         
         try:
             logger.info(f"Starting {content_type} download: {quality} from {url}")
             
-            # Get download options
-            if content_type not in DOWNLOAD_OPTIONS or quality not in DOWNLOAD_OPTIONS[content_type]:
+            # Memoized merge of base options and quality overrides; only
+            # the per-call progress hook goes on a shallow copy
+            template = _build_ydl_opts(content_type, quality)
+            if template is None:
                 raise ValueError(f"Invalid {content_type} quality: {quality}")
             
-            options = DOWNLOAD_OPTIONS[content_type][quality]
-            
-            # Configure yt-dlp options
-            ydl_opts = Config.YT_DLP_OPTIONS.copy()
-            ydl_opts['format'] = options['format']
-            
-            # Add postprocessors for audio
-            if content_type == 'audio' and 'postprocessors' in options:
-                ydl_opts['postprocessors'] = options['postprocessors']
-                ydl_opts['keepvideo'] = False  # Don't keep original video for audio extraction
-            
-            # Add progress hook if provided
+            ydl_opts = template.copy()
             if progress_callback:
                 ydl_opts['progress_hooks'] = [progress_callback]
             
-            # Perform download in thread pool to avoid blocking
-            result = await asyncio.get_event_loop().run_in_executor(
-                None, self._download_sync, url, ydl_opts
-            )
+            # Perform download in the bounded thread pool; the semaphore
+            # applies back-pressure before a job is even queued.
+            # get_running_loop avoids the deprecated get_event_loop path
+            # (asyncio.to_thread can't target the custom executor)
+            async with self._semaphore:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._download_sync, url, ydl_opts, info
+                )
             
             # Process result
             filename = result['filename']
@@ -145,11 +207,12 @@ class EnhancedVideoDownloader:
             if content_type == 'audio':
                 filename = self._find_audio_file(filename, quality)
             
-            # Verify file exists and get size
-            if not os.path.exists(filename):
+            # Verify existence, emptiness and size with a single stat
+            st = stat_or_none(filename)
+            if st is None:
                 raise ValueError(f"Downloaded file not found: {filename}")
             
-            filesize = get_file_size(filename)
+            filesize = st.st_size
             if filesize == 0:
                 raise ValueError("Downloaded file is empty")
             
@@ -177,12 +240,22 @@ class EnhancedVideoDownloader:
             raise ValueError(f"Download failed: {str(e)}")
             
         finally:
-            self.active_downloads.pop(download_id, None)
+            self.active_downloads.discard(download_key)
     
-    def _download_sync(self, url: str, ydl_opts: Dict) -> Dict:
+    def _download_sync(self, url: str, ydl_opts: Dict,
+                       info: Optional[Dict] = None) -> Dict:
         """Synchronous download function to run in thread pool"""
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+            if info is not None:
+                # Metadata was already extracted for the preview;
+                # process_ie_result resolves the chosen format and
+                # downloads without re-fetching the page. Deep-copied
+                # because it also mutates nested structures (annotates
+                # and sorts the formats entries in place) and the input
+                # is shared with the validator's raw-info cache
+                info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
             filename = ydl.prepare_filename(info)
             
             return {
@@ -193,36 +266,43 @@ class EnhancedVideoDownloader:
                 'filesize': info.get('filesize', 0)
             }
     
+    # Map quality to expected extension
+    _EXTENSION_MAP = {
+        'mp3': '.mp3',
+        'm4a': '.m4a',
+        'ogg': '.ogg'
+    }
+    
+    _AUDIO_EXTENSIONS = frozenset(['.mp3', '.m4a', '.ogg', '.wav', '.flac'])
+    
     def _find_audio_file(self, base_filename: str, quality: str) -> str:
         """Find the actual audio file after postprocessing"""
         base_path = os.path.splitext(base_filename)[0]
         
-        # Map quality to expected extension
-        extension_map = {
-            'mp3': '.mp3',
-            'm4a': '.m4a',
-            'ogg': '.ogg'
-        }
-        
-        expected_ext = extension_map.get(quality, '.mp3')
-        audio_file = base_path + expected_ext
-        
+        # Fast path: the extension the postprocessor should have produced
+        audio_file = base_path + self._EXTENSION_MAP.get(quality, '.mp3')
         if os.path.exists(audio_file):
             return audio_file
         
-        # Fallback: check for any audio file with the base name
-        for ext in ['.mp3', '.m4a', '.ogg', '.wav', '.flac']:
-            candidate = base_path + ext
-            if os.path.exists(candidate):
-                return candidate
+        # Fallback: one directory scan instead of a stat per candidate
+        # extension; also catches extensions yt-dlp picked unexpectedly
+        dirname, prefix = os.path.split(base_path)
+        try:
+            with os.scandir(dirname or '.') as entries:
+                for entry in entries:
+                    name = entry.name
+                    stem, _, ext = name.rpartition('.')
+                    if stem == prefix and '.' + ext in self._AUDIO_EXTENSIONS:
+                        return entry.path
+        except OSError as e:
+            logger.warning(f"Audio file scan failed in {dirname}: {e}")
         
         # If no audio file found, return original filename
         return base_filename
     
     def is_download_active(self, url: str, content_type: str, quality: str) -> bool:
         """Check if a download is currently active"""
-        download_id = hash(f"{url}_{content_type}_{quality}")
-        return download_id in self.active_downloads
+        return (url, content_type, quality) in self.active_downloads
     
     def get_active_downloads_count(self) -> int:
         """Get number of active downloads"""
@@ -230,11 +310,11 @@ class EnhancedVideoDownloader:
     
     def cancel_download(self, url: str, content_type: str, quality: str) -> bool:
         """Cancel an active download (if possible)"""
-        download_id = hash(f"{url}_{content_type}_{quality}")
-        if download_id in self.active_downloads:
+        download_key = (url, content_type, quality)
+        if download_key in self.active_downloads:
             # Note: yt-dlp doesn't support cancellation easily
             # This is more of a placeholder for future implementation
-            logger.warning(f"Download cancellation requested for {download_id}")
+            logger.warning(f"Download cancellation requested for {download_key}")
             return True
         return False
 
@@ -243,7 +323,8 @@ class FileUploader:
     
     @staticmethod
     async def upload_to_telegram(bot, chat_id: int, file_path: str, 
-                                content_type: str, caption: str = None) -> bool:
+                                content_type: str, caption: str = None,
+                                reply_markup=None) -> bool:
         """
         Upload file to Telegram
         
@@ -253,6 +334,7 @@ class FileUploader:
             file_path: Path to file to upload
             content_type: 'video' or 'audio'
             caption: Optional caption
+            reply_markup: Optional inline keyboard for the media message
             
         Returns:
             True if upload successful
@@ -263,36 +345,42 @@ class FileUploader:
         try:
             logger.info(f"Uploading {content_type} file: {file_path}")
             
-            # Check file exists and size
-            if not os.path.exists(file_path):
+            # Check existence, emptiness and size with a single stat
+            st = stat_or_none(file_path)
+            if st is None:
                 raise ValueError("File not found")
             
-            filesize = get_file_size(file_path)
-            if filesize == 0:
+            if st.st_size == 0:
                 raise ValueError("File is empty")
             
-            if is_file_too_large(file_path):
+            if st.st_size > Config.MAX_FILE_SIZE_MB * 1024 * 1024:
                 raise ValueError("File too large for Telegram (>50MB)")
             
+            # Read the file off-thread so pulling up to 50MB from disk
+            # never stalls the event loop mid-upload
+            async with aiofiles.open(file_path, 'rb') as file:
+                data = await file.read()
+            
             # Upload based on content type
-            with open(file_path, 'rb') as file:
-                if content_type == 'video':
-                    await bot.send_video(
-                        chat_id=chat_id,
-                        video=file,
-                        caption=caption,
-                        supports_streaming=True,
-                        read_timeout=300,
-                        write_timeout=300
-                    )
-                else:  # audio
-                    await bot.send_audio(
-                        chat_id=chat_id,
-                        audio=file,
-                        caption=caption,
-                        read_timeout=300,
-                        write_timeout=300
-                    )
+            if content_type == 'video':
+                await bot.send_video(
+                    chat_id=chat_id,
+                    video=data,
+                    caption=caption,
+                    reply_markup=reply_markup,
+                    supports_streaming=True,
+                    read_timeout=300,
+                    write_timeout=300
+                )
+            else:  # audio
+                await bot.send_audio(
+                    chat_id=chat_id,
+                    audio=data,
+                    caption=caption,
+                    reply_markup=reply_markup,
+                    read_timeout=300,
+                    write_timeout=300
+                )
             
             logger.info(f"Successfully uploaded {content_type} file")
             return True
@@ -26,8 +26,9 @@ def check_python_version():
     """Check if Python version is compatible"""
     print("🐍 Checking Python version...")
     
-    if sys.version_info < (3, 8):
-        print("❌ Python 3.8 or higher is required")
+    # config.py uses dataclass(slots=True), which needs 3.10+
+    if sys.version_info < (3, 10):
+        print("❌ Python 3.10 or higher is required")
         print(f"   Current version: {sys.version}")
         return False
     
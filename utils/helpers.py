@@ -5,27 +5,65 @@ Helper functions and utilities for the Telegram Video Downloader Bot
 import os
 import asyncio
 import logging
+import re
+import time
+import zlib
+from collections import defaultdict
+from functools import lru_cache
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 def cleanup_file(file_path: str) -> None:
     """Safely remove a file if it exists"""
+    # Remove directly and treat "already gone" as success — one syscall
+    # instead of exists+remove, and no window for a race between them
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Cleaned up file: {file_path}")
-    except Exception as e:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
         logger.error(f"Failed to cleanup file {file_path}: {e}")
+    else:
+        _STAT_CACHE.pop(file_path, None)
+        logger.info(f"Cleaned up file: {file_path}")
+
+def stat_or_none(file_path: str) -> Optional[os.stat_result]:
+    """Stat a file once, returning None if it doesn't exist or can't be read.
+
+    One syscall answers existence, emptiness and size-limit checks that
+    would otherwise each stat the file separately.
+    """
+    try:
+        return os.stat(file_path)
+    except OSError:
+        return None
+
+# Short-TTL stat cache: the pipeline asks about the same file several
+# times in quick succession (exists? empty? too large?), and within one
+# second the answer doesn't change. Negative results (-1) are cached too.
+_STAT_TTL = 1.0
+_STAT_CACHE = {}
+
+def _cached_size(file_path: str) -> int:
+    """File size in bytes via the TTL stat cache, -1 if it doesn't exist"""
+    now = time.monotonic()
+    cached = _STAT_CACHE.get(file_path)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    st = stat_or_none(file_path)
+    size = st.st_size if st is not None else -1
+
+    if len(_STAT_CACHE) > 256:
+        _STAT_CACHE.clear()
+    _STAT_CACHE[file_path] = (now + _STAT_TTL, size)
+    return size
 
 def get_file_size(file_path: str) -> int:
     """Get file size in bytes, return 0 if file doesn't exist"""
-    try:
-        if os.path.exists(file_path):
-            return os.path.getsize(file_path)
-    except Exception as e:
-        logger.error(f"Failed to get file size for {file_path}: {e}")
-    return 0
+    size = _cached_size(file_path)
+    return size if size > 0 else 0
 
 def is_file_too_large(file_path: str, max_size_mb: int = None) -> bool:
     """Check if file is too large for Telegram"""
@@ -37,18 +75,32 @@ def is_file_too_large(file_path: str, max_size_mb: int = None) -> bool:
     max_size_bytes = max_size_mb * 1024 * 1024
     return file_size > max_size_bytes
 
+# Invalid filename characters mapped to '_' in one C-level pass
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+_INVALID_RE = re.compile(r'[<>:"/\\|?*]')
+
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename by removing invalid characters"""
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
-    return filename[:100]  # Limit length
+    # Most titles are already clean — one regex scan avoids building a
+    # translated copy just to find nothing changed
+    if _INVALID_RE.search(filename) is None:
+        return filename[:100]  # Limit length
+    return filename.translate(_SANITIZE_TABLE)[:100]
 
+@lru_cache(maxsize=4096)
 def extract_video_id_from_url(url: str) -> Optional[str]:
     """Extract video ID from URL for caching purposes"""
     try:
-        # Simple hash-based ID for any URL
-        return str(hash(url) % 1000000)
+        # crc32 is C-speed and stable across interpreter runs (hash() is
+        # randomized per process), so IDs survive restarts; base36 keeps
+        # them short
+        video_id = zlib.crc32(url.encode('utf-8'))
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+        chars = []
+        while video_id:
+            video_id, rem = divmod(video_id, 36)
+            chars.append(digits[rem])
+        return ''.join(reversed(chars)) or '0'
     except Exception:
         return None
 
@@ -59,56 +111,66 @@ async def run_with_timeout(coro, timeout: int):
     except asyncio.TimeoutError:
         raise TimeoutError(f"Operation timed out after {timeout} seconds")
 
+# Error keywords folded into one alternation; dispatch on which group hit.
+# Only the first ~200 chars are scanned — the classifying keywords appear
+# early, and it bounds work on huge tracebacks.
+_ERROR_RE = re.compile(
+    r'(private|unavailable)|(network|connection)|(timeout)|(format)|(ffmpeg)',
+    re.IGNORECASE)
+
+# Messages indexed by the matched group (group 1 is platform-specific)
+_ERROR_MESSAGES = (
+    None,
+    None,
+    "❌ Network error. Please check your connection and try again.",
+    "❌ Download timeout. The content might be too large or server is slow.",
+    "❌ Requested format not available. Try a different quality option.",
+    "❌ Audio processing failed. FFmpeg might not be installed properly.",
+)
+
 def format_error_message(error: Exception, platform: str = None) -> str:
     """Format error message for user display"""
-    error_str = str(error).lower()
+    error_str = str(error)
+    match = _ERROR_RE.search(error_str[:200])
     
-    # Check for specific error types
-    if 'private' in error_str or 'unavailable' in error_str:
+    if match is None:
+        return f"❌ Download failed: {error_str[:100]}..."
+    
+    if match.lastindex == 1:
         if platform:
             return f"❌ {platform.title()} content unavailable. It might be private or deleted."
         return "❌ Content unavailable. It might be private or deleted."
     
-    elif 'network' in error_str or 'connection' in error_str:
-        return "❌ Network error. Please check your connection and try again."
-    
-    elif 'timeout' in error_str:
-        return "❌ Download timeout. The content might be too large or server is slow."
-    
-    elif 'format' in error_str:
-        return "❌ Requested format not available. Try a different quality option."
-    
-    elif 'ffmpeg' in error_str:
-        return "❌ Audio processing failed. FFmpeg might not be installed properly."
-    
-    else:
-        return f"❌ Download failed: {str(error)[:100]}..."
+    return _ERROR_MESSAGES[match.lastindex]
+
+# One alternation scan replaces a dozen interpreter-level substring
+# checks; group names double as the platform labels via match.lastgroup
+_PLATFORM_RE = re.compile(
+    r'(?P<YouTube>youtube\.com|youtu\.be)'
+    r'|(?P<TikTok>tiktok\.com)'
+    r'|(?P<Instagram>instagram\.com)'
+    r'|(?P<Twitter>twitter\.com|x\.com)'
+    r'|(?P<Facebook>facebook\.com|fb\.watch)'
+    r'|(?P<Vimeo>vimeo\.com)'
+    r'|(?P<Dailymotion>dailymotion\.com)'
+    r'|(?P<Reddit>reddit\.com)',
+    re.IGNORECASE)
 
+@lru_cache(maxsize=1024)
 def get_platform_from_url(url: str) -> str:
-    """Extract platform name from URL"""
-    url_lower = url.lower()
-    
-    if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-        return 'YouTube'
-    elif 'tiktok.com' in url_lower:
-        return 'TikTok'
-    elif 'instagram.com' in url_lower:
-        return 'Instagram'
-    elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-        return 'Twitter'
-    elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-        return 'Facebook'
-    elif 'vimeo.com' in url_lower:
-        return 'Vimeo'
-    elif 'dailymotion.com' in url_lower:
-        return 'Dailymotion'
-    elif 'reddit.com' in url_lower:
-        return 'Reddit'
-    else:
-        return 'Unknown'
+    """Extract platform name from URL (memoized; called on both the
+    success and error paths of every extraction)"""
+    match = _PLATFORM_RE.search(url)
+    return match.lastgroup if match else 'Unknown'
+
+# All 11 possible bars for the default 10-slot width, rendered once —
+# progress callbacks fire often enough that rebuilding them adds up
+_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
 
 def create_progress_bar(percent: float, length: int = 10) -> str:
     """Create a visual progress bar"""
+    if length == 10:
+        return f"[{_BARS[min(int(percent / 10), 10)]}]"
     filled = int(percent / 100 * length)
     bar = "█" * filled + "░" * (length - filled)
     return f"[{bar}]"
@@ -119,29 +181,49 @@ def truncate_text(text: str, max_length: int = 50) -> str:
         return text
     return text[:max_length-3] + "..."
 
+# Deletes are coalesced per chat behind a short debounce so a cleanup
+# burst becomes one deleteMessages round trip instead of one HTTPS
+# request per message (the API accepts up to 100 ids per call)
+_PENDING_DELETES = defaultdict(list)
+_DELETE_FLUSH_DELAY = 0.05
+
+# Strong references to in-flight flush tasks — asyncio only keeps weak
+# ones, and losing a flush would wedge that chat's queue for good (the
+# pending list never empties, so no later call reschedules)
+_delete_flush_tasks = set()
+
+async def _flush_deletes(bot, chat_id: int):
+    """Send every delete queued for a chat in batched API calls"""
+    await asyncio.sleep(_DELETE_FLUSH_DELAY)
+    message_ids = _PENDING_DELETES.pop(chat_id, None)
+    if not message_ids:
+        return
+
+    for start in range(0, len(message_ids), 100):
+        batch = message_ids[start:start + 100]
+        try:
+            await bot.delete_messages(chat_id=chat_id, message_ids=batch)
+        except Exception as e:
+            logger.warning(f"Failed to delete messages {batch}: {e}")
+
 async def safe_delete_message(bot, chat_id: int, message_id: int):
-    """Safely delete a message without raising exceptions"""
-    try:
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception as e:
-        logger.warning(f"Failed to delete message {message_id}: {e}")
+    """Safely delete a message without raising exceptions.
+
+    The delete is queued and flushed shortly after, batched with any
+    other deletes for the same chat.
+    """
+    pending = _PENDING_DELETES[chat_id]
+    pending.append(message_id)
+    # First delete for this chat schedules the flush; later ones ride along
+    if len(pending) == 1:
+        task = asyncio.get_running_loop().create_task(_flush_deletes(bot, chat_id))
+        _delete_flush_tasks.add(task)
+        task.add_done_callback(_delete_flush_tasks.discard)
+
+# Token shape: numeric bot ID, colon, then a 35+ char secret
+# ("123456789:ABCdefGHIjklMNOpqrsTUVwxyz...")
+_TOKEN_RE = re.compile(r'\d+:[A-Za-z0-9_-]{35,}')
 
 def validate_bot_token(token: str) -> bool:
     """Validate Telegram bot token format"""
-    if not token:
-        return False
-    
-    # Basic format check: should be like "123456789:ABCdefGHIjklMNOpqrsTUVwxyz"
-    parts = token.split(':')
-    if len(parts) != 2:
-        return False
-    
-    # First part should be numeric (bot ID)
-    if not parts[0].isdigit():
-        return False
-    
-    # Second part should be alphanumeric (token)
-    if len(parts[1]) < 35:  # Minimum token length
-        return False
-    
-    return True
\ No newline at end of file
+    return bool(token and _TOKEN_RE.fullmatch(token))
\ No newline at end of file
@@ -2,24 +2,37 @@
 Inline keyboard layouts for the Telegram Video Downloader Bot
 """
 
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from config import DOWNLOAD_OPTIONS
 
+# Static markups are immutable, so every caller can share one instance.
+# They are materialized once at the bottom of this module; the builders
+# just return them, saving a markup plus N button allocations per call.
+
+# DOWNLOAD_OPTIONS is static, so each quality button's label and
+# callback_data prefix are rendered once at import; building a keyboard
+# only appends the per-session token to the prefix
+_QUALITY_SKELETON = {
+    content_type: tuple(
+        (f"{quality_info['emoji']} {quality_info['description']}",
+         f"q{content_type[0]}{quality_key}_")
+        for quality_key, quality_info in options.items()
+    )
+    for content_type, options in DOWNLOAD_OPTIONS.items()
+}
+
 def create_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Create main menu keyboard"""
-    keyboard = [
-        [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
-        [InlineKeyboardButton("❓ Help", callback_data="menu_help")],
-        [InlineKeyboardButton("📊 My Stats", callback_data="menu_stats")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _MAIN_MENU
 
-def create_content_type_keyboard(video_url: str) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=512)
+def create_content_type_keyboard(token: str) -> InlineKeyboardMarkup:
     """Create keyboard for selecting content type (video/audio)"""
-    url_hash = hash(video_url) % 10000
     keyboard = [
-        [InlineKeyboardButton("🎬 Video Download", callback_data=f"type_video_{url_hash}")],
-        [InlineKeyboardButton("🎵 Audio Only", callback_data=f"type_audio_{url_hash}")],
+        [InlineKeyboardButton("🎬 Video Download", callback_data=f"tv{token}")],
+        [InlineKeyboardButton("🎵 Audio Only", callback_data=f"ta{token}")],
         [
             InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel")
@@ -27,39 +40,31 @@ def create_content_type_keyboard(video_url: str) -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_quality_keyboard(content_type: str, video_url: str) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=512)
+def create_quality_keyboard(content_type: str, token: str) -> InlineKeyboardMarkup:
     """Create keyboard for quality/format selection based on content type"""
-    keyboard = []
-    url_hash = hash(video_url) % 10000
-    
-    options = DOWNLOAD_OPTIONS[content_type]
-    
-    for quality_key, quality_info in options.items():
-        callback_data = f"quality_{content_type}_{quality_key}_{url_hash}"
-        button_text = f"{quality_info['emoji']} {quality_info['description']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-    
+    keyboard = [
+        [InlineKeyboardButton(button_text, callback_data=f"{prefix}{token}")]
+        for button_text, prefix in _QUALITY_SKELETON[content_type]
+    ]
+
     # Add navigation buttons
     keyboard.append([
-        InlineKeyboardButton("⬅️ Back", callback_data=f"back_type_{url_hash}"),
+        InlineKeyboardButton("⬅️ Back", callback_data=f"b{token}"),
         InlineKeyboardButton("❌ Cancel", callback_data="cancel")
     ])
-    
+
     return InlineKeyboardMarkup(keyboard)
 
 def create_cancel_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard with cancel and main menu options"""
-    keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
-        [InlineKeyboardButton("❌ Cancel", callback_data="cancel")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _CANCEL
 
-def create_retry_keyboard(video_url: str) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=512)
+def create_retry_keyboard(token: str) -> InlineKeyboardMarkup:
     """Create keyboard with retry option"""
-    url_hash = hash(video_url) % 10000
     keyboard = [
-        [InlineKeyboardButton("🔄 Try Again", callback_data=f"retry_{url_hash}")],
+        [InlineKeyboardButton("🔄 Try Again", callback_data=f"r{token}")],
         [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
         [InlineKeyboardButton("❌ Cancel", callback_data="cancel")]
     ]
@@ -67,36 +72,52 @@ def create_retry_keyboard(video_url: str) -> InlineKeyboardMarkup:
 
 def create_completion_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard shown after successful download"""
-    keyboard = [
-        [InlineKeyboardButton("📥 Download Another", callback_data="menu_download")],
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
-        [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _COMPLETION
 
 def create_help_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for help message"""
-    keyboard = [
-        [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
-        [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _HELP
 
 def create_error_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for error messages"""
-    keyboard = [
-        [InlineKeyboardButton("🔄 Try Again", callback_data="menu_download")],
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
-        [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _ERROR
 
 def create_stats_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for stats message"""
-    keyboard = [
-        [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
-        [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
-        [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return _STATS
+
+# Shared instances of the token-independent markups
+_MAIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
+    [InlineKeyboardButton("❓ Help", callback_data="menu_help")],
+    [InlineKeyboardButton("📊 My Stats", callback_data="menu_stats")]
+])
+
+_CANCEL = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
+    [InlineKeyboardButton("❌ Cancel", callback_data="cancel")]
+])
+
+_COMPLETION = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 Download Another", callback_data="menu_download")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
+    [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
+])
+
+_HELP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
+    [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")]
+])
+
+_ERROR = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Try Again", callback_data="menu_download")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="menu_main")],
+    [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
+])
+
+_STATS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 Start Download", callback_data="menu_download")],
+    [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
+    [InlineKeyboardButton("❓ Help", callback_data="menu_help")]
+])
@@ -2,6 +2,9 @@
 Message templates and formatting for the Telegram Video Downloader Bot
 """
 
+from utils.helpers import create_progress_bar
+
+
 def format_duration(seconds: int) -> str:
     """Format duration in seconds to human readable format"""
     if not seconds:
@@ -18,71 +21,123 @@ def format_duration(seconds: int) -> str:
     else:
         return f"{seconds}s"
 
+_FILESIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
 def format_filesize(bytes_size: int) -> str:
     """Format file size in bytes to human readable format"""
     if not bytes_size:
         return "Unknown"
     
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if bytes_size < 1024.0:
-            return f"{bytes_size:.1f} {unit}"
-        bytes_size /= 1024.0
-    return f"{bytes_size:.1f} TB"
+    # bit_length picks the unit directly (each unit spans 10 bits of
+    # magnitude) — no divide-and-compare loop
+    index = min((int(bytes_size).bit_length() - 1) // 10, 4)
+    return f"{bytes_size / (1 << (index * 10)):.1f} {_FILESIZE_UNITS[index]}"
+
+# Static message bodies rendered once at import time
+_WELCOME_HTML = (
+    "🎬 <b>Video Downloader Bot</b>\n\n"
+    "I can download videos from YouTube, TikTok, Instagram, Twitter, and many other platforms!\n\n"
+    "🚀 <b>How to use:</b>\n"
+    "• Just send me any video URL\n"
+    "• Or use the buttons below\n\n"
+    "✨ <b>No commands needed!</b> Simply paste a link and I'll handle the rest!"
+)
+
+_HELP_HTML = (
+    "🆘 <b>Help - Video Downloader Bot</b>\n\n"
+    "🚀 <b>How to Download:</b>\n"
+    "1. Send me any video URL\n"
+    "2. Choose Video or Audio\n"
+    "3. Select quality/format\n"
+    "4. Wait for your download!\n\n"
+    "🌐 <b>Supported Platforms:</b>\n"
+    "• YouTube (youtube.com, youtu.be)\n"
+    "• TikTok (tiktok.com)\n"
+    "• Instagram (instagram.com)\n"
+    "• Twitter (twitter.com, x.com)\n"
+    "• And 1000+ more platforms!\n\n"
+    "🎬 <b>Video Quality Options:</b>\n"
+    "• 📱 720p - Fast download, smaller file\n"
+    "• 🎬 1080p - Balanced quality and size\n"
+    "• ⭐ Best - Highest available quality\n\n"
+    "🎵 <b>Audio Format Options:</b>\n"
+    "• 🎵 MP3 - Universal compatibility\n"
+    "• 🎼 M4A - High quality, smaller size\n"
+    "• 🎶 OGG - Open source format\n\n"
+    "⚠️ <b>Limitations:</b>\n"
+    "• Maximum file size: 50MB\n"
+    "• Rate limit: 5 downloads per hour\n"
+    "• Private content not supported\n\n"
+    "💡 <b>Tip:</b> Just paste any video link - no commands needed!"
+)
+
+_UPLOAD_STARTING_HTML = "📤 <b>Uploading to Telegram...</b>\nPlease wait..."
+
+_PROCESSING_HTML = "🔍 <b>Analyzing video...</b>\nPlease wait..."
+
+_INVALID_URL_HTML = (
+    "❌ <b>Invalid URL</b>\n\n"
+    "Please provide a valid video URL.\n\n"
+    "📝 <b>Usage:</b> /download &lt;video_url&gt;\n"
+    "💡 <b>Example:</b> /download https://youtube.com/watch?v=..."
+)
+
+_NO_URL_FOUND_HTML = (
+    "🤔 <b>No video URL found!</b>\n\n"
+    "Please paste a valid video link.\n\n"
+    "💡 <b>Examples:</b>\n"
+    "• YouTube: https://youtube.com/watch?v=...\n"
+    "• TikTok: https://tiktok.com/@user/video/...\n"
+    "• Instagram: https://instagram.com/p/..."
+)
+
+_DOWNLOAD_PROMPT_HTML = (
+    "📥 <b>Paste your video link below</b>\n\n"
+    "✨ Just send me the URL - I'll handle the rest!"
+)
+
+_MAIN_MENU_HTML = (
+    "🏠 <b>Main Menu</b>\n\n"
+    "What would you like to do?\n\n"
+    "💡 <b>Tip:</b> You can also just send me any video URL directly!"
+)
+
+_WAITING_FOR_LINK_HTML = (
+    "⏳ <b>Waiting for your link...</b>\n\n"
+    "📝 Please paste any video URL and I'll process it for you!\n\n"
+    "🌐 <b>Supported platforms:</b> YouTube, TikTok, Instagram, Twitter, and 1000+ more!"
+)
+
+
+# Built once — both selection templates look platforms up here
+_PLATFORM_EMOJI = {
+    'youtube': '📺',
+    'tiktok': '🎵',
+    'instagram': '📸',
+    'twitter': '🐦',
+}
+
 
 class MessageTemplates:
-    @staticmethod
-    def welcome_message() -> str:
-        return (
-            "🎬 <b>Video Downloader Bot</b>\n\n"
-            "I can download videos from YouTube, TikTok, Instagram, Twitter, and many other platforms!\n\n"
-            "🚀 <b>How to use:</b>\n"
-            "• Just send me any video URL\n"
-            "• Or use the buttons below\n\n"
-            "✨ <b>No commands needed!</b> Simply paste a link and I'll handle the rest!"
-        )
-    
-    @staticmethod
-    def help_message() -> str:
-        return (
-            "🆘 <b>Help - Video Downloader Bot</b>\n\n"
-            "🚀 <b>How to Download:</b>\n"
-            "1. Send me any video URL\n"
-            "2. Choose Video or Audio\n"
-            "3. Select quality/format\n"
-            "4. Wait for your download!\n\n"
-            "🌐 <b>Supported Platforms:</b>\n"
-            "• YouTube (youtube.com, youtu.be)\n"
-            "• TikTok (tiktok.com)\n"
-            "• Instagram (instagram.com)\n"
-            "• Twitter (twitter.com, x.com)\n"
-            "• And 1000+ more platforms!\n\n"
-            "🎬 <b>Video Quality Options:</b>\n"
-            "• 📱 720p - Fast download, smaller file\n"
-            "• 🎬 1080p - Balanced quality and size\n"
-            "• ⭐ Best - Highest available quality\n\n"
-            "🎵 <b>Audio Format Options:</b>\n"
-            "• 🎵 MP3 - Universal compatibility\n"
-            "• 🎼 M4A - High quality, smaller size\n"
-            "• 🎶 OGG - Open source format\n\n"
-            "⚠️ <b>Limitations:</b>\n"
-            "• Maximum file size: 50MB\n"
-            "• Rate limit: 5 downloads per hour\n"
-            "• Private content not supported\n\n"
-            "💡 <b>Tip:</b> Just paste any video link - no commands needed!"
-        )
-    
+    # Fixed templates are plain class attributes — reading one is a
+    # single attribute lookup, no call frame for a constant string
+    welcome_message = _WELCOME_HTML
+    help_message = _HELP_HTML
+    upload_starting = _UPLOAD_STARTING_HTML
+    processing_url = _PROCESSING_HTML
+    invalid_url_message = _INVALID_URL_HTML
+    no_url_found_message = _NO_URL_FOUND_HTML
+    download_prompt_message = _DOWNLOAD_PROMPT_HTML
+    main_menu_message = _MAIN_MENU_HTML
+    waiting_for_link_message = _WAITING_FOR_LINK_HTML
+
     @staticmethod
     def content_type_selection(video_info: dict) -> str:
-        platform_emoji = {
-            'youtube': '📺',
-            'tiktok': '🎵',
-            'instagram': '📸',
-            'twitter': '🐦',
-        }.get(video_info['platform'].lower(), '🎬')
+        platform_emoji = _PLATFORM_EMOJI.get(video_info['platform'].lower(), '🎬')
         
         return (
             f"🎯 <b>Choose download type for:</b>\n"
-            f"{platform_emoji} <b>{video_info['platform']}</b> - {video_info['title'][:50]}...\n\n"
+            f"{platform_emoji} <b>{video_info['platform']}</b> - {video_info['title_short']}...\n\n"
             f"👤 <b>Uploader:</b> {video_info['uploader']}\n"
             f"⏱️ <b>Duration:</b> {format_duration(video_info['duration'])}\n\n"
             "What would you like to download?"
@@ -90,18 +145,13 @@ class MessageTemplates:
     
     @staticmethod
     def quality_selection(content_type: str, video_info: dict) -> str:
-        platform_emoji = {
-            'youtube': '📺',
-            'tiktok': '🎵',
-            'instagram': '📸',
-            'twitter': '🐦',
-        }.get(video_info['platform'].lower(), '🎬')
+        platform_emoji = _PLATFORM_EMOJI.get(video_info['platform'].lower(), '🎬')
         
         type_text = "🎬 Video Quality" if content_type == 'video' else "🎵 Audio Format"
         
         return (
             f"🎯 <b>Choose {type_text.lower()} for:</b>\n"
-            f"{platform_emoji} <b>{video_info['platform']}</b> - {video_info['title'][:50]}...\n\n"
+            f"{platform_emoji} <b>{video_info['platform']}</b> - {video_info['title_short']}...\n\n"
             f"👤 <b>Uploader:</b> {video_info['uploader']}\n"
             f"⏱️ <b>Duration:</b> {format_duration(video_info['duration'])}\n\n"
             f"Select your preferred {type_text.lower()}:"
@@ -116,20 +166,12 @@ class MessageTemplates:
     
     @staticmethod
     def download_progress(percent: float, speed: str = "N/A") -> str:
-        # Create progress bar
-        filled = int(percent / 10)
-        bar = "█" * filled + "░" * (10 - filled)
-        
         return (
             f"⬇️ <b>Downloading...</b>\n"
-            f"📊 Progress: [{bar}] {percent:.1f}%\n"
+            f"📊 Progress: {create_progress_bar(percent)} {percent:.1f}%\n"
             f"🚀 Speed: {speed}"
         )
     
-    @staticmethod
-    def upload_starting() -> str:
-        return "📤 <b>Uploading to Telegram...</b>\nPlease wait..."
-    
     @staticmethod
     def download_complete(filename: str, filesize: int, content_type: str) -> str:
         type_emoji = "🎬" if content_type == 'video' else "🎵"
@@ -142,10 +184,6 @@ class MessageTemplates:
             f"{type_emoji} Enjoy your {type_text.lower()}!"
         )
     
-    @staticmethod
-    def processing_url() -> str:
-        return "🔍 <b>Analyzing video...</b>\nPlease wait..."
-    
     @staticmethod
     def rate_limit_message(reset_time: int) -> str:
         return (
@@ -153,46 +191,3 @@ class MessageTemplates:
             f"You've reached the maximum of 5 downloads per hour.\n"
             f"⏳ Try again in {reset_time} minutes."
         )
-    
-    @staticmethod
-    def invalid_url_message() -> str:
-        return (
-            "❌ <b>Invalid URL</b>\n\n"
-            "Please provide a valid video URL.\n\n"
-            "📝 <b>Usage:</b> /download &lt;video_url&gt;\n"
-            "💡 <b>Example:</b> /download https://youtube.com/watch?v=..."
-        )
-    
-    @staticmethod
-    def no_url_found_message() -> str:
-        return (
-            "🤔 <b>No video URL found!</b>\n\n"
-            "Please paste a valid video link.\n\n"
-            "💡 <b>Examples:</b>\n"
-            "• YouTube: https://youtube.com/watch?v=...\n"
-            "• TikTok: https://tiktok.com/@user/video/...\n"
-            "• Instagram: https://instagram.com/p/..."
-        )
-    
-    @staticmethod
-    def download_prompt_message() -> str:
-        return (
-            "📥 <b>Paste your video link below</b>\n\n"
-            "✨ Just send me the URL - I'll handle the rest!"
-        )
-    
-    @staticmethod
-    def main_menu_message() -> str:
-        return (
-            "🏠 <b>Main Menu</b>\n\n"
-            "What would you like to do?\n\n"
-            "💡 <b>Tip:</b> You can also just send me any video URL directly!"
-        )
-    
-    @staticmethod
-    def waiting_for_link_message() -> str:
-        return (
-            "⏳ <b>Waiting for your link...</b>\n\n"
-            "📝 Please paste any video URL and I'll process it for you!\n\n"
-            "🌐 <b>Supported platforms:</b> YouTube, TikTok, Instagram, Twitter, and 1000+ more!"
-        )
\ No newline at end of file
@@ -2,147 +2,246 @@
 Rate limiting functionality for the Telegram Video Downloader Bot
 """
 
+import asyncio
 import time
 import logging
-from collections import defaultdict
+from array import array
 from typing import Tuple
 
 logger = logging.getLogger(__name__)
 
+# Shared coarse clock. With hour-scale windows and minute-scale reset
+# granularity, every limiter call sharing one timestamp refreshed every
+# 100 ms is indistinguishable from calling time.time() per call — but it
+# collapses the per-call clock reads under bursts into ~10/second.
+_CLOCK_INTERVAL = 0.1
+_NOW = [time.time()]
+_clock_task = None  # Strong reference — asyncio only keeps weak ones
+
+async def _refresh_clock() -> None:
+    """Keep the shared coarse timestamp fresh"""
+    while True:
+        _NOW[0] = time.time()
+        await asyncio.sleep(_CLOCK_INTERVAL)
+
+def start_clock() -> None:
+    """Start the coarse-clock refresher on the running event loop.
+
+    Called once at application startup (post_init); until then — and if
+    the refresher ever dies — _coarse_now falls back to reading the
+    clock directly, so the limiter can never freeze users out on a
+    stale timestamp.
+    """
+    global _clock_task
+    if _clock_task is not None and not _clock_task.done():
+        return
+    _clock_task = asyncio.get_running_loop().create_task(_refresh_clock())
+
+def _coarse_now() -> float:
+    """The shared timestamp, or a direct clock read without a live refresher"""
+    if _clock_task is None or _clock_task.done():
+        return time.time()
+    return _NOW[0]
+
+class _Bucket:
+    """Fixed-capacity ring of request timestamps for one user.
+
+    The window never holds more than max_requests entries, so a flat
+    float array of exactly that size replaces a per-user deque of boxed
+    floats: one small object per user, no growth between cleanups.
+    """
+
+    __slots__ = ('ts', 'head', 'count')
+
+    def __init__(self, size: int):
+        self.ts = array('d', [0.0] * size)
+        self.head = 0  # Index of the oldest timestamp
+        self.count = 0
+
+    def expire(self, now: float, window: int) -> None:
+        """Drop timestamps that have left the window (oldest first)"""
+        ts = self.ts
+        size = len(ts)
+        while self.count and now - ts[self.head] >= window:
+            self.head = (self.head + 1) % size
+            self.count -= 1
+
+    def append(self, now: float) -> None:
+        """Record a request timestamp (caller ensures capacity)"""
+        self.ts[(self.head + self.count) % len(self.ts)] = now
+        self.count += 1
+
+    def pop(self) -> None:
+        """Discard the most recent timestamp"""
+        self.count -= 1
+
+    def oldest(self) -> float:
+        """Timestamp of the oldest request in the window"""
+        return self.ts[self.head]
+
 class RateLimiter:
     """Rate limiter to prevent abuse and manage download limits"""
-    
+
     def __init__(self, max_requests: int = 5, time_window: int = 3600):
         """
         Initialize rate limiter
-        
+
         Args:
             max_requests: Maximum number of requests allowed per time window
             time_window: Time window in seconds (default: 1 hour)
         """
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = defaultdict(list)
+        # 16 independent user_id-sharded dicts. Every check-then-mutate
+        # below runs without an await between the read and the write, so
+        # under cooperative asyncio scheduling each call is one atomic
+        # critical section — keep it that way when editing these methods.
+        # Sharding keeps each dict small and lets a multi-loop deployment
+        # split shards across processes without touching the interface.
+        self._shards = tuple({} for _ in range(16))
         logger.info(f"Rate limiter initialized: {max_requests} requests per {time_window} seconds")
-    
+
+    def _shard(self, user_id: int) -> dict:
+        """The shard dict holding a user's bucket"""
+        return self._shards[user_id & 15]
+
+    def _bucket(self, user_id: int) -> _Bucket:
+        """Get (or create) the timestamp ring for a user"""
+        shard = self._shards[user_id & 15]
+        bucket = shard.get(user_id)
+        if bucket is None:
+            bucket = shard[user_id] = _Bucket(self.max_requests)
+        return bucket
+
     def is_allowed(self, user_id: int) -> Tuple[bool, int]:
         """
         Check if user is allowed to make a request
-        
+
         Args:
             user_id: Telegram user ID
-            
+
         Returns:
             Tuple of (is_allowed, reset_time_minutes)
         """
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        # Remove old requests outside the time window
-        user_requests[:] = [req_time for req_time in user_requests 
-                           if now - req_time < self.time_window]
-        
+        now = _coarse_now()
+        bucket = self._bucket(user_id)
+        bucket.expire(now, self.time_window)
+
         # Check if user has exceeded the limit
-        if len(user_requests) >= self.max_requests:
-            # Calculate when the oldest request will expire
-            oldest_request = min(user_requests)
-            reset_time_seconds = int(oldest_request + self.time_window - now)
+        if bucket.count >= self.max_requests:
+            reset_time_seconds = int(bucket.oldest() + self.time_window - now)
             reset_time_minutes = max(1, reset_time_seconds // 60)
-            
+
             logger.warning(f"Rate limit exceeded for user {user_id}. Reset in {reset_time_minutes} minutes")
             return False, reset_time_minutes
-        
+
         # Add current request
-        user_requests.append(now)
-        logger.debug(f"Request allowed for user {user_id}. Count: {len(user_requests)}/{self.max_requests}")
+        bucket.append(now)
+        logger.debug(f"Request allowed for user {user_id}. Count: {bucket.count}/{self.max_requests}")
         return True, 0
-    
+
+    def peek(self, user_id: int) -> Tuple[bool, int]:
+        """
+        Check whether a request would be allowed without consuming a slot
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            Tuple of (is_allowed, reset_time_minutes)
+        """
+        now = _coarse_now()
+        bucket = self._bucket(user_id)
+        bucket.expire(now, self.time_window)
+
+        if bucket.count >= self.max_requests:
+            reset_time_seconds = int(bucket.oldest() + self.time_window - now)
+            return False, max(1, reset_time_seconds // 60)
+
+        return True, 0
+
     def refund_request(self, user_id: int) -> None:
         """Refund the most recent request for a user (in case of failure)"""
-        user_requests = self.requests[user_id]
-        if user_requests:
+        bucket = self._shard(user_id).get(user_id)
+        if bucket is not None and bucket.count:
             # Remove the most recent request
-            user_requests.pop()
-            logger.debug(f"Refunded request for user {user_id}. Count: {len(user_requests)}/{self.max_requests}")
-    
+            bucket.pop()
+            logger.debug(f"Refunded request for user {user_id}. Count: {bucket.count}/{self.max_requests}")
+
     def get_remaining_requests(self, user_id: int) -> int:
         """Get number of remaining requests for user"""
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        # Remove old requests
-        user_requests[:] = [req_time for req_time in user_requests 
-                           if now - req_time < self.time_window]
-        
-        return max(0, self.max_requests - len(user_requests))
-    
+        bucket = self._shard(user_id).get(user_id)
+        if bucket is None:
+            return self.max_requests
+
+        bucket.expire(_coarse_now(), self.time_window)
+        return max(0, self.max_requests - bucket.count)
+
     def get_reset_time(self, user_id: int) -> int:
         """Get time until rate limit resets for user (in minutes)"""
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        if not user_requests:
+        now = _coarse_now()
+        bucket = self._shard(user_id).get(user_id)
+
+        if bucket is None or not bucket.count:
             return 0
-        
-        # Remove old requests
-        user_requests[:] = [req_time for req_time in user_requests 
-                           if now - req_time < self.time_window]
-        
-        if len(user_requests) < self.max_requests:
+
+        bucket.expire(now, self.time_window)
+
+        if bucket.count < self.max_requests:
             return 0
-        
-        oldest_request = min(user_requests)
-        reset_time_seconds = int(oldest_request + self.time_window - now)
+
+        reset_time_seconds = int(bucket.oldest() + self.time_window - now)
         return max(1, reset_time_seconds // 60)
-    
+
     def reset_user_limit(self, user_id: int) -> None:
         """Reset rate limit for a specific user (admin function)"""
-        if user_id in self.requests:
-            del self.requests[user_id]
+        shard = self._shard(user_id)
+        if user_id in shard:
+            del shard[user_id]
             logger.info(f"Rate limit reset for user {user_id}")
-    
+
     def get_stats(self) -> dict:
         """Get rate limiter statistics"""
-        now = time.time()
+        now = _coarse_now()
         active_users = 0
         total_requests = 0
-        
-        for user_id, user_requests in self.requests.items():
-            # Clean old requests
-            user_requests[:] = [req_time for req_time in user_requests 
-                               if now - req_time < self.time_window]
-            
-            if user_requests:
-                active_users += 1
-                total_requests += len(user_requests)
-        
+
+        for shard in self._shards:
+            for bucket in shard.values():
+                bucket.expire(now, self.time_window)
+
+                if bucket.count:
+                    active_users += 1
+                    total_requests += bucket.count
+
         return {
             'active_users': active_users,
             'total_requests': total_requests,
             'max_requests_per_user': self.max_requests,
             'time_window_hours': self.time_window / 3600
         }
-    
+
     def cleanup_old_entries(self) -> None:
         """Clean up old entries to prevent memory leaks"""
-        now = time.time()
-        users_to_remove = []
-        
-        for user_id, user_requests in self.requests.items():
-            # Remove old requests
-            user_requests[:] = [req_time for req_time in user_requests 
-                               if now - req_time < self.time_window]
-            
-            # If no recent requests, mark user for removal
-            if not user_requests:
-                users_to_remove.append(user_id)
-        
-        # Remove users with no recent requests
-        for user_id in users_to_remove:
-            del self.requests[user_id]
-        
-        if users_to_remove:
-            logger.debug(f"Cleaned up {len(users_to_remove)} inactive users from rate limiter")
+        now = _coarse_now()
+        removed = 0
+
+        for shard in self._shards:
+            users_to_remove = []
+            for user_id, bucket in shard.items():
+                bucket.expire(now, self.time_window)
+
+                # If no recent requests, mark user for removal
+                if not bucket.count:
+                    users_to_remove.append(user_id)
+
+            # Remove users with no recent requests
+            for user_id in users_to_remove:
+                del shard[user_id]
+            removed += len(users_to_remove)
+
+        if removed:
+            logger.debug(f"Cleaned up {removed} inactive users from rate limiter")
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
\ No newline at end of file
+rate_limiter = RateLimiter()
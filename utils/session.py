@@ -0,0 +1,62 @@
+"""
+Per-user session state for the Telegram Video Downloader Bot
+"""
+
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Sessions older than this are swept so user_data doesn't grow unbounded
+SESSION_TTL_SECONDS = 30 * 60
+SESSION_SWEEP_INTERVAL = 5 * 60
+
+# Monotonic counter for session tokens: O(1) to generate and collision-free,
+# unlike hashing the URL on every button press
+_session_counter = itertools.count()
+
+_B36_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _to_base36(n: int) -> str:
+    """Encode a non-negative integer in base36"""
+    if n == 0:
+        return '0'
+    digits = []
+    while n:
+        n, rem = divmod(n, 36)
+        digits.append(_B36_DIGITS[rem])
+    return ''.join(reversed(digits))
+
+
+def next_session_token() -> str:
+    """Return a fresh process-unique session token, base36-encoded to keep
+    callback_data well inside Telegram's 64-byte budget"""
+    return _to_base36(next(_session_counter))
+
+
+@dataclass(slots=True)
+class Session:
+    """State of one download conversation, stored under a single user_data key"""
+    url: str
+    info: dict
+    token: str
+    content_type: Optional[str] = None
+    ts: float = field(default_factory=time.monotonic)
+
+
+async def sweep_stale_sessions(context) -> None:
+    """JobQueue callback: drop sessions idle past their TTL so the per-user
+    dicts stay bounded even for users who never finish a download"""
+    now = time.monotonic()
+    swept = 0
+    for user_data in context.application.user_data.values():
+        session = user_data.get('session')
+        if session is not None and now - session.ts > SESSION_TTL_SECONDS:
+            user_data.clear()
+            swept += 1
+    if swept:
+        logger.info("Swept %d stale session(s)", swept)